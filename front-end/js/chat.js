@@ -1,4 +1,10 @@
 var checkout = {};
+// Lex session returned by the API; reusing it keeps the conversation (and LF0's replay cache) per user
+var sessionId = null;
+// GET /results long-polls for up to ~10 s per call; give up after this many calls
+var MAX_RESULT_POLLS = 6;
+// a failed or timed-out POST is re-sent this many times with the same message id
+var MAX_CHAT_RETRIES = 2;
 
 $(document).ready(function() {
   var $messages = $('.messages-content'),
@@ -25,16 +31,63 @@ $(document).ready(function() {
     }
   }
 
-  function callChatbotApi(message) {
-    // params, body, additionalParams
+  function newMessageId() {
+    return Date.now().toString(36) + Math.random().toString(36).slice(2, 8);
+  }
+
+  function callChatbotApi(message, messageId, attempt) {
+    attempt = attempt || 0;
+    // params, body, additionalParams; retries reuse the message id, so LF0 replays a reply
+    // it already produced (e.g. when API Gateway timed out) instead of taking a second Lex turn
     return sdk.chatbotPost({}, {
+      sessionId: sessionId,
       messages: [{
         type: 'unstructured',
         unstructured: {
+          id: messageId,
           text: message
         }
       }]
-    }, {});
+    }, {})
+      .catch((error) => {
+        var status = error && error.response ? error.response.status : 0;
+        if (attempt >= MAX_CHAT_RETRIES || (status && status < 500 && status !== 429)) {
+          throw error;
+        }
+        return new Promise((resolve) => setTimeout(resolve, 500 * Math.pow(2, attempt)))
+          .then(() => callChatbotApi(message, messageId, attempt + 1));
+      });
+  }
+
+  function escapeHtml(text) {
+    return $('<div>').text(text == null ? '' : String(text)).html();
+  }
+
+  function insertResults(data) {
+    var html = 'Here are my ' + escapeHtml(data.cuisine) + ' picks' +
+      (data.location ? ' in ' + escapeHtml(data.location) : '') + ':<ol>';
+    for (var r of data.restaurants) {
+      html += '<li><b>' + escapeHtml(r.name) + '</b> (' + escapeHtml(r.rating) + '&#9733;)<br>' +
+        escapeHtml(r.address) + '</li>';
+    }
+    insertResponseMessage(html + '</ol>');
+  }
+
+  function pollResults(since, attempt) {
+    if (attempt >= MAX_RESULT_POLLS) {
+      return;
+    }
+    sdk.resultsGet({ sessionId: sessionId, since: since }, {}, {})
+      .then((response) => {
+        if (response.data.status === 'ready') {
+          insertResults(response.data);
+        } else {
+          pollResults(since, attempt + 1);
+        }
+      })
+      .catch((error) => {
+        console.log('polling for results failed', error);
+      });
   }
 
   function insertMessage() {
@@ -47,10 +100,16 @@ $(document).ready(function() {
     $('.message-input').val(null);
     updateScrollbar();
 
-    callChatbotApi(msg)
+    callChatbotApi(msg, newMessageId())
       .then((response) => {
         console.log(response);
         var data = response.data;
+        if (data.sessionId) {
+          sessionId = data.sessionId;
+        }
+        if (data.resultsPending) {
+          pollResults(data.resultsSince, 0);
+        }
 
         if (data.messages && data.messages.length > 0) {
           console.log('received ' + data.messages.length + ' messages');
@@ -1,16 +1,77 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import json
 import os
+import re
 import uuid
 import datetime
-import boto3
+from collections import OrderedDict
 from botocore.exceptions import BotoCoreError, ClientError
+import aws_clients
+from instrumentation import count, flush, log, log_enabled, span
 
 REGION = os.getenv("LEX_REGION", os.environ.get("AWS_REGION", "us-east-1"))
 LEX_BOT_ID       = os.environ.get("LEX_BOT_ID")
 LEX_BOT_ALIAS_ID = os.environ.get("LEX_BOT_ALIAS_ID")
 LEX_LOCALE_ID    = os.environ.get("LEX_LOCALE_ID", "en_US")
 
-lex = boto3.client("lexv2-runtime",region_name=REGION)
+# Stateless intents answered without calling Lex; the replies are LF1's own constant strings
+FAST_PATH = os.getenv("FAST_PATH", "true").lower() == "true"
+FAST_PATH_REPLIES = [
+    (re.compile(r"(hi|hello|hey|hiya|howdy|good (morning|afternoon|evening))( there)?", re.I), "Hi there, how can I help?"),
+    (re.compile(r"(thanks|thank you|thank you so much|thanks a lot|many thanks|thx|ty)", re.I), "You’re welcome!"),
+]
+# A retried message (same session and message id) gets the reply that was already
+# produced instead of a second Lex turn; messages without an id are never replayed.
+# Replies live in the container that produced them, so this is best-effort: a retry that
+# lands on another container (or overlaps the first attempt) still reaches Lex
+REPLAY_TTL_SECONDS = int(os.getenv("REPLAY_TTL_SECONDS", "30"))
+REPLAY_MAX_ENTRIES = int(os.getenv("REPLAY_MAX_ENTRIES", "1000"))
+# how long a session's last known dialog state is kept (Lex's idle session timeout)
+DIALOG_TTL_SECONDS = int(os.getenv("DIALOG_TTL_SECONDS", "300"))
+
+# Results store written by LF2; GET /results long-polls it for the chat UI
+RESULTS_TABLE = os.getenv("RESULTS_TABLE", "")
+POLL_WAIT_SECONDS = float(os.getenv("POLL_WAIT_SECONDS", "10"))  # stay under API Gateway's 29 s
+POLL_INTERVAL_SECONDS = float(os.getenv("POLL_INTERVAL_SECONDS", "0.5"))
+DINING_INTENT = "DiningSuggestionsIntent"
+
+
+class TtlCache:
+    """Small LRU dict whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+replies = TtlCache(REPLAY_TTL_SECONDS, REPLAY_MAX_ENTRIES)
+dialogs = TtlCache(DIALOG_TTL_SECONDS, REPLAY_MAX_ENTRIES)  # session_id -> dialog still open
+
+
+def get_lex():
+    return aws_clients.client("lexv2-runtime", REGION)
+
+
+def get_results_table():
+    return aws_clients.table(RESULTS_TABLE)
 
 def _bad_request(msg, code=403):
     return {
@@ -24,8 +85,49 @@ def _bad_request(msg, code=403):
     }
 
 
+def _chat_response(out_text, session_id, extra=None):
+    resp = [
+        {
+            "type": "unstructured",
+            "unstructured": {
+                "id": "1",
+                "text": out_text,
+                "timestamp": datetime.datetime.now().isoformat(),
+            },
+        }
+    ]
+
+    return {
+        "statusCode": 200,
+        "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Allow-Methods": "OPTIONS,POST",
+            },
+        "body": json.dumps({"messages": resp, "sessionId": session_id, **(extra or {})}),
+    }
+
+
+def fast_path_reply(text: str) -> str | None:
+    """LF1's reply for a bare greeting or thanks, or None when Lex has to interpret the text."""
+    s = text.strip().rstrip("!.? ")
+    for pattern, reply in FAST_PATH_REPLIES:
+        if pattern.fullmatch(s):
+            return reply
+    return None
+
+
 def lambda_handler(event, context):
+    try:
+        if event.get("path") == "/results":
+            return handle_results(event, context)
+        return handle_chat(event)
+    finally:
+        aws_clients.report_cold_start()
+        flush("LF0")
 
+
+def handle_chat(event):
     path = event.get("path")
     method = event.get("httpMethod")
 
@@ -50,17 +152,41 @@ def lambda_handler(event, context):
         return _bad_request("No text found")
 
     session_id = body.get("sessionId") or str(uuid.uuid4())
+    # chat.js sends a per-message id that its retries reuse; the same text is not the same
+    # message (a second "2" answers a different slot), so there is no text-only key
+    message_id = unstructured.get("id")
+    replay_key = (session_id, message_id) if message_id else None
+    cached = replies.get(replay_key) if replay_key else None
+    if cached is not None:
+        count("ReplayHits")
+        return _chat_response(*cached)
+
+    # a greeting in the middle of a dining dialog still goes to Lex, which owns the slot state;
+    # only a new session, or one whose last turn this container saw close, is known to be idle
+    if FAST_PATH and (not body.get("sessionId") or dialogs.get(session_id) is False):
+        reply = fast_path_reply(text)
+        if reply is not None:
+            count("FastPathHits")
+            dialogs.put(session_id, False)
+            if replay_key:
+                replies.put(replay_key, (reply, session_id))
+            return _chat_response(reply, session_id)
 
+    # taken before Lex runs: LF1 enqueues the request during recognize_text, and LF2 can
+    # store its results before the call returns
+    requested_at = int(time.time() * 1000)
     try:
-        lex_resp = lex.recognize_text(
-            botId=LEX_BOT_ID,
-            botAliasId=LEX_BOT_ALIAS_ID,
-            localeId=LEX_LOCALE_ID,
-            sessionId=session_id,
-            text=text,
-        )
+        with span("LexRecognizeText"):
+            lex_resp = get_lex().recognize_text(
+                botId=LEX_BOT_ID,
+                botAliasId=LEX_BOT_ALIAS_ID,
+                localeId=LEX_LOCALE_ID,
+                sessionId=session_id,
+                text=text,
+            )
 
-        print(f"Lex response: {lex_resp}")
+        if log_enabled("DEBUG"):
+            log("DEBUG", f"Lex response: {lex_resp}")
 
         out_text_parts = []
         for m in lex_resp.get("messages", []):
@@ -70,27 +196,82 @@ def lambda_handler(event, context):
 
         out_text = " ".join(out_text_parts).strip() or "Sorry, I didn't catch that."
 
-        resp = [
-            {
-                "type": "unstructured",
-                "unstructured": {
-                    "id": "1",
-                    "text": out_text,
-                    "timestamp": datetime.datetime.now().isoformat(),
-                },
-            }
-        ]
+        session_state = lex_resp.get("sessionState") or {}
+        dialog_action = session_state.get("dialogAction") or {}
+        dialogs.put(session_id, dialog_action.get("type", "Close") != "Close")
 
-        return {
-            "statusCode": 200,
-            "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,POST",
-                },
-            "body": json.dumps({"messages": resp, "sessionId": session_id}),
-        }
+        # a fulfilled dining request tells the UI to poll for results stored after it was sent
+        extra = None
+        intent = session_state.get("intent") or {}
+        if RESULTS_TABLE and intent.get("name") == DINING_INTENT and intent.get("state") == "Fulfilled":
+            extra = {"resultsPending": True, "resultsSince": requested_at}
+        if replay_key:
+            replies.put(replay_key, (out_text, session_id, extra))
+
+        return _chat_response(out_text, session_id, extra)
 
     except (BotoCoreError, ClientError) as e:
-        print(f"Lex call failed: {e}")
+        log("ERROR", f"Lex call failed: {e}")
+        count("LexErrors")
         return _bad_request("Failed to contact Lex", code=500)
+
+
+def handle_results(event, context=None):
+    """
+    GET /results?sessionId=...&since=<epoch ms>: long-polls the results store for up to
+    POLL_WAIT_SECONDS and returns LF2's recommendations for the session once they are
+    newer than `since`, or {"status": "pending"}.
+    """
+    if event.get("httpMethod") != "GET" or not RESULTS_TABLE:
+        return _bad_request("Invalid path or method")
+
+    params = event.get("queryStringParameters") or {}
+    session_id = params.get("sessionId")
+    if not session_id:
+        return _bad_request("No sessionId found", code=400)
+    try:
+        since = int(params.get("since") or 0)
+    except ValueError:
+        return _bad_request("since must be epoch milliseconds", code=400)
+
+    deadline = time.monotonic() + POLL_WAIT_SECONDS
+    if context is not None:
+        deadline = min(deadline, time.monotonic() + context.get_remaining_time_in_millis() / 1000 - 1)
+    item = None
+    try:
+        while True:
+            with span("DynamoGetResults"):
+                found = get_results_table().get_item(Key={"session_id": session_id}, ConsistentRead=True).get("Item")
+            if found and int(found.get("created_at", 0)) > since:
+                item = found
+                break
+            if time.monotonic() + POLL_INTERVAL_SECONDS > deadline:
+                break
+            time.sleep(POLL_INTERVAL_SECONDS)
+    except (BotoCoreError, ClientError) as e:
+        log("ERROR", f"Results lookup failed: {e}")
+        return _bad_request("Failed to read results", code=500)
+
+    body = {"sessionId": session_id, "status": "pending"}
+    if item is not None:
+        count("ResultsDelivered")
+        body.update({
+            "status": "ready",
+            "createdAt": int(item["created_at"]),
+            "cuisine": item.get("cuisine"),
+            "location": item.get("location"),
+            "diningTime": item.get("dining_time"),
+            "restaurants": item.get("restaurants", []),
+        })
+    return {
+        "statusCode": 200,
+        "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST",
+            },
+        "body": json.dumps(body, default=str),
+    }
+
+
+aws_clients.record_import("LF0", _IMPORT_STARTED)
@@ -1,8 +1,21 @@
-import json, os, re, boto3
-sqs = boto3.client('sqs')
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import json, os
+import aws_clients
+import slot_normalizer
+from instrumentation import count, flush, span
 QUEUE_URL = os.environ['QUEUE_URL']
 
 CUISINES = {"chinese","japanese","italian","mexican","american"}
+normalizer = slot_normalizer.SlotNormalizer(CUISINES)
+NORMALIZERS = {
+    "Location": slot_normalizer.location,
+    "Cuisine": normalizer.cuisine,
+    "DiningTime": slot_normalizer.dining_time,
+    "NumPeople": slot_normalizer.party_size,
+    "Email": slot_normalizer.email,
+}
 
 def close(intent, message):
     return {
@@ -22,28 +35,54 @@ def elicit(slot, intent, message):
         "messages": [{"contentType": "PlainText", "content": message}]
     }
 
-def handle_dining(intent):
+def normalize_slots(slots):
+    """
+    Normalized value of each dining slot (None if missing or not understood). Values Lex
+    could not resolve are read from what the user typed; normalized values are written
+    back into the slots, so later turns and Lex's own state agree.
+    """
+    values = {}
+    changed = 0
+    for name, normalize in NORMALIZERS.items():
+        value = (slots.get(name) or {}).get("value") or {}
+        raw = value.get("interpretedValue") or value.get("originalValue")
+        values[name] = normalize(raw) if raw else None
+        if values[name] and values[name] != value.get("interpretedValue"):
+            slots[name]["value"] = {**value, "interpretedValue": values[name]}
+            changed += 1
+    count("SlotsNormalized", changed)
+    return values
+
+def handle_dining(intent, session_id=None):
     slots = intent.get("slots") or {}
-    get = lambda k: (slots.get(k) or {}).get("value", {}).get("interpretedValue")
+    values = normalize_slots(slots)
 
-    loc = get("Location")
-    cui = (get("Cuisine") or "").lower()
-    time = get("DiningTime")
-    num = get("NumPeople")
-    email = get("Email")
+    loc = values["Location"]
+    cui = values["Cuisine"]
+    time = values["DiningTime"]
+    num = values["NumPeople"]
+    email = values["Email"]
 
     if not loc: return elicit("Location", intent, "What city or area are you looking to dine in?")
-    if cui not in CUISINES: return elicit("Cuisine", intent, f"Which cuisine? Try {', '.join(CUISINES)}")
-    if not num or not num.isdigit(): return elicit("NumPeople", intent, "How many people are in your party?")
-    if not time or not re.fullmatch(r"\d{2}:\d{2}", time): return elicit("DiningTime", intent, "What time? (HH:MM)")
-    if not email or "@" not in email: return elicit("Email", intent, "What email should I send results to?")
+    if not cui: return elicit("Cuisine", intent, f"Which cuisine? Try {', '.join(sorted(CUISINES))}")
+    if not num: return elicit("NumPeople", intent, "How many people are in your party?")
+    if not time: return elicit("DiningTime", intent, "What time? (e.g. 7pm or 19:30)")
+    if not email: return elicit("Email", intent, "What email should I send results to?")
 
-    payload = {"Location": loc, "Cuisine": cui, "DiningTime": time, "NumPeople": num, "Email": email}
-    sqs.send_message(QueueUrl=QUEUE_URL, MessageBody=json.dumps(payload))
+    payload = {"Location": loc, "Cuisine": cui, "DiningTime": time, "NumPeople": num, "Email": email, "SessionId": session_id}
+    with span("SqsSendMessage"):
+        aws_clients.client("sqs").send_message(QueueUrl=QUEUE_URL, MessageBody=json.dumps(payload))
 
     return close(intent, f"Got it! I’ll email {email} some {cui.title()} options in {loc} for {num} people at {time}.")
 
 def lambda_handler(event, context):
+    try:
+        return route_intent(event)
+    finally:
+        aws_clients.report_cold_start()
+        flush("LF1")
+
+def route_intent(event):
     intent = event["sessionState"]["intent"]
     name = intent["name"]
 
@@ -52,8 +91,8 @@ def lambda_handler(event, context):
     elif name == "ThankYouIntent":
         return close(intent, "You’re welcome!")
     elif name == "DiningSuggestionsIntent":
-        return handle_dining(intent)
+        return handle_dining(intent, event.get("sessionId"))
     else:
         return close(intent, "Sorry, I didn’t get that.")
 
-
+aws_clients.record_import("LF1", _IMPORT_STARTED)
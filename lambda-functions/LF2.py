@@ -1,191 +1,664 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import json
 import os
 import html
-import boto3
+import datetime
+import hashlib
+import random
+from collections import OrderedDict
 from typing import List
-from boto3.dynamodb.conditions import Key
+from zoneinfo import ZoneInfo
 from decimal import Decimal
 from botocore.exceptions import ClientError
-from requests_aws4auth import AWS4Auth
-from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
+import aws_clients
+from instrumentation import count, flush, log, span
+from catalog_snapshot import CatalogSnapshot, load_snapshot
+from geo import resolve_location
+from idempotency import (
+    STAGE_DONE, STAGE_EMAILED, STAGE_LOOKED_UP, STAGE_STORED, AlreadyInProgress, DynamoIdempotencyStore,
+    MemoryIdempotencyStore, idempotency_key,
+)
+from leaderboard import LEADERBOARD_HOURS, leaderboard_key, read_board
+from opening_hours import OpeningHoursIndex, minute_of_week
+from ranking import Columns
+from restaurant_record import Restaurant
 
 # aoss config
 region = 'us-east-1'
 service = 'aoss'
-credentials = boto3.Session().get_credentials()
-auth = AWSV4SignerAuth(credentials, region, service)
-client = OpenSearch(
-    hosts=[{"host": os.getenv("AOSS_HOST"), "port": 443}],
-    http_auth=auth,
-    use_ssl=True,
-    verify_certs=True,
-    connection_class=RequestsHttpConnection,
-)
+AOSS_HOST = os.getenv("AOSS_HOST")
 AOSS_INDEX = os.getenv("AOSS_INDEX", "restaurant_index")
+AOSS_CUISINE_FIELD = os.getenv("AOSS_CUISINE_FIELD", "cuisine.keyword")
+# Randomized retrieval: each session is hashed into one of RANDOM_SEED_BUCKETS seeds, which
+# picks its restaurants from the cuisine's shared candidate pool, so repeat users see
+# different restaurants while one lookup still serves every message of the cuisine
+RANDOM_SAMPLING = os.getenv("RANDOM_SAMPLING", "true").lower() == "true"
+RANDOM_SEED_BUCKETS = int(os.getenv("RANDOM_SEED_BUCKETS", "16"))
+AOSS_RANDOM_FIELD = os.getenv("AOSS_RANDOM_FIELD", "restaurant_id.keyword")
 
 
 
 # DynamoDB config
-dynamodb = boto3.resource("dynamodb")
 TABLE_NAME = os.getenv("TABLE_NAME", "yelp-restaurants")
 DEFAULT_LIMIT = int(os.getenv("DEFAULT_LIMIT", "10"))
 SENDER = os.getenv("EMAIL_SENDER", "concierge.service.cc@gmail.com")
-table = dynamodb.Table(TABLE_NAME)
-CUISINE_INDEX = os.getenv("CUISINE_INDEX", "rating-index")
 
-def lambda_handler(event, context):
-    body = event[0].get("body")
-    msg_to_be_processed = json.loads(body)
-    # {
-    #   "Location":"New York",
-    #   "Cuisine":"italian",
-    #   "DiningTime":"19:00",
-    #   "NumPeople":"5",
-    #   "Email":"abc@abc.com"
-    # }
+# Results store polled by LF0 for the chat UI (keyed by sessionId); empty disables it
+RESULTS_TABLE = os.getenv("RESULTS_TABLE", "")
+RESULTS_TTL_SECONDS = int(os.getenv("RESULTS_TTL_SECONDS", "3600"))
+# with a results store the email becomes an optional second channel
+EMAIL_RESULTS = os.getenv("EMAIL_RESULTS", "true").lower() == "true"
+
+# SES bulk delivery
+SES_TEMPLATE_NAME = os.getenv("SES_TEMPLATE_NAME", "dining-suggestions")
+SES_BULK_MAX_DESTINATIONS = 50  # SendBulkTemplatedEmail limit
+SES_MAX_RETRIES = int(os.getenv("SES_MAX_RETRIES", "4"))
+SES_THROTTLE_CODES = {"Throttling", "ThrottlingException"}  # ClientError codes
+SES_RETRY_STATUSES = {"AccountThrottled", "TransientFailure"}  # per-destination statuses
+_email_template_ready = False
+
+# Two-stage retrieval: OpenSearch ids -> DynamoDB BatchGetItem
+BATCH_GET_CHUNK = 100  # BatchGetItem hard limit
+BATCH_GET_MAX_RETRIES = int(os.getenv("BATCH_GET_MAX_RETRIES", "5"))
+OVERFETCH_FACTOR = int(os.getenv("OVERFETCH_FACTOR", "3"))
+MAX_CANDIDATES = int(os.getenv("MAX_CANDIDATES", "500"))
+RESTAURANT_PROJECTION = "#id, #n, address, rating, cuisine, business_hours, open_intervals, #l, zip_code, price, review_count, coordinates, display"
+# DiningTime has no date or zone; it is read as today in the restaurants' city
+DINING_TIMEZONE = os.getenv("DINING_TIMEZONE", "America/New_York")
+RESTAURANT_PROJECTION_NAMES = {"#id": "business_id", "#n": "name", "#l": "location"}
+
+# Warm-container restaurant cache
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "64"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+ROW_CACHE_TTL_SECONDS = int(os.getenv("ROW_CACHE_TTL_SECONDS", "3600"))
+ROW_CACHE_MAX_ENTRIES = int(os.getenv("ROW_CACHE_MAX_ENTRIES", "2000"))
+ROW_CACHE_MAX_BYTES = int(os.getenv("ROW_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+CATALOG_VERSION_CHECK_SECONDS = int(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "60"))
+# written by YelpFetch after every successful ingestion run
+CATALOG_META_KEY = {"cuisine": "__meta__", "business_id": "catalog_version"}
+
+# Embedded mode: answer from an in-process catalog snapshot (local path or s3:// URL)
+# written by YelpFetch; requests fall back to OpenSearch + DynamoDB while it is stale
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "")
+_snapshot = None
+_snapshot_checked_at = 0.0
+
+# Answer requests without a location from YelpFetch's precomputed leaderboard items
+# (one GetItem, cached per catalog version); the remote path covers the rest
+LEADERBOARDS = os.getenv("LEADERBOARDS", "false").lower() == "true"
+
+# Dedupe redelivered messages and resume retries after the last completed stage:
+# a DynamoDB table name, "memory" for the per-container stand-in, or "" for off
+IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "")
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# keep at or below the queue's visibility timeout, so a crashed attempt's claim has expired by the retry
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+
+
+# Clients are created on first use and reused across warm invocations
+def get_search_client():
+    return aws_clients.opensearch(AOSS_HOST, region, service)
+
+
+def get_dynamodb():
+    # low-level client: items come back in wire format and go straight into Restaurant.from_wire
+    return aws_clients.client("dynamodb")
+
+
+def get_table():
+    return aws_clients.table(TABLE_NAME)
+
+
+def get_results_table():
+    return aws_clients.table(RESULTS_TABLE)
+
+
+class RestaurantCache:
+    """LRU cache of candidate lists keyed by (cuisine, limit), bounded by TTL, entry count and size."""
+
+    def __init__(self, ttl: int, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self.leaderboards_version = None  # catalog version YelpFetch last brought every leaderboard up to
+        self.version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, size: int | None = None):
+        if size is None:
+            size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, version=None):
+        self._entries.clear()
+        self.bytes = 0
+        self.version = version
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "version": self.version,
+        }
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+
+restaurant_cache = RestaurantCache(CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+if IDEMPOTENCY_TABLE == "memory":
+    idempotency = MemoryIdempotencyStore(IDEMPOTENCY_LEASE_SECONDS, IDEMPOTENCY_TTL_SECONDS)
+elif IDEMPOTENCY_TABLE:
+    idempotency = DynamoIdempotencyStore(IDEMPOTENCY_TABLE, IDEMPOTENCY_LEASE_SECONDS, IDEMPOTENCY_TTL_SECONDS)
+else:
+    idempotency = None
+# finished (html, text) email rows keyed by (business_id, catalog version)
+row_cache = RestaurantCache(ROW_CACHE_TTL_SECONDS, ROW_CACHE_MAX_ENTRIES, ROW_CACHE_MAX_BYTES)
+
+
+def refresh_catalog_version(cache: RestaurantCache = restaurant_cache):
+    """Drop cached results when YelpFetch has published a new catalog version."""
+    now = time.monotonic()
+    if cache.version_checked_at and now - cache.version_checked_at < CATALOG_VERSION_CHECK_SECONDS:
+        return
+    cache.version_checked_at = now
+    try:
+        item = get_table().get_item(Key=CATALOG_META_KEY).get("Item") or {}
+    except ClientError as e:
+        log("WARN", f"Could not read catalog version: {e.response['Error']['Message']}")
+        return
+    version = item.get("version")
+    if version != cache.version:
+        if cache.version is not None:
+            log("INFO", f"Catalog version changed {cache.version} -> {version}, clearing cache")
+        cache.invalidate(version)
+    cache.leaderboards_version = item.get("leaderboards_version")
 
-    q_location = msg_to_be_processed.get("Location")
-    cuisine = msg_to_be_processed.get("Cuisine")
-    dining_time = msg_to_be_processed.get("DiningTime")
-    num_people = msg_to_be_processed.get("NumPeople")
-    email = msg_to_be_processed.get("Email")
 
-    restaurant_ids = aoss_query(cuisine, DEFAULT_LIMIT)
-    restaurants = query_top_by_cuisine(cuisine, restaurant_ids, DEFAULT_LIMIT, 0.0)
+def current_snapshot(version: str | None) -> CatalogSnapshot | None:
+    """
+    The container's catalog snapshot if it matches the catalog `version`. A stale or
+    missing snapshot is reloaded at most every CATALOG_VERSION_CHECK_SECONDS.
+    """
+    global _snapshot, _snapshot_checked_at
+    if not CATALOG_SNAPSHOT:
+        return None
+    if _snapshot is not None and (version is None or _snapshot.version == version):
+        return _snapshot
+    now = time.monotonic()
+    if _snapshot_checked_at and now - _snapshot_checked_at < CATALOG_VERSION_CHECK_SECONDS:
+        return None
+    _snapshot_checked_at = now
+    try:
+        with span("SnapshotLoad"):
+            _snapshot = load_snapshot(CATALOG_SNAPSHOT)
+    except Exception as e:
+        log("WARN", f"Could not load catalog snapshot {CATALOG_SNAPSHOT}: {e}")
+        return None
+    log("INFO", f"Loaded catalog snapshot {_snapshot.version} with {len(_snapshot)} restaurants")
+    if version is not None and _snapshot.version != version:
+        log("WARN", f"Catalog snapshot {_snapshot.version} is stale (catalog {version}), using remote lookups")
+        return None
+    return _snapshot
 
-    if dining_time:
-        restaurants = filter_by_dining_time(restaurants, dining_time)
 
+def sampling_seed(msg: dict) -> int | None:
+    if not RANDOM_SAMPLING:
+        return None
+    ident = msg.get("SessionId") or msg.get("Email") or ""
+    return int(hashlib.sha1(ident.encode("utf-8")).hexdigest(), 16) % RANDOM_SEED_BUCKETS
 
-    print(f"Found {len(restaurants)} restaurants for cuisine={cuisine} at time={dining_time}")
 
-    msg_id = send_restaurant_recommendations_email(
-    sender=SENDER,
-    recipients=[email],
-    subject="Your dining suggestions",
-    intro_text="Here are the best-rated options that match your request:",
-    restaurants=restaurants,  # list from your DynamoDB + time filter
-    ses_region="us-east-1",)
-    print("SES MessageId:", msg_id)
+def lookup_restaurants(cuisine: str, limit: int, dining_time: str | None = None, day: int | None = None,
+                       seed: int | None = None, cache: RestaurantCache = restaurant_cache,
+                       origin: tuple[float, float] | None = None) -> list[Restaurant]:
+    """
+    Top `limit` restaurants for a cuisine, open at `dining_time` on `day` if given.
+    With an `origin`, candidates are the cuisine's restaurants nearest to it; otherwise,
+    with a `seed`, they are a random sample of the cuisine instead of its first hits.
+    Candidates are ranked by RANK_WEIGHTS (rating, review count, price and, with an
+    `origin`, distance) over the pool's feature columns.
+
+    The cached entry is a growing candidate pool per (cuisine, limit, origin), shuffled by
+    the seed of the request that created it. When too few candidates survive the time
+    filter, the pool is extended with the next OpenSearch page (doubling in size each
+    round) until enough match, the index is exhausted or MAX_CANDIDATES is reached. With
+    a `seed`, `limit` of the best OVERFETCH_FACTOR * `limit` matches are sampled, keeping
+    their rank order, as `leaderboard_lookup` does.
+    """
+    if origin is not None:
+        seed = None  # nearest first; sampling would drop the nearby restaurants
+    key = (cuisine, limit, origin)
+    pool = cache.get(key) or {"items": [], "next_from": 0, "exhausted": False, "seed": seed}
+    fetch_size = max(limit * OVERFETCH_FACTOR, 1)
+    grown = False
+
+    while True:
+        if dining_time:
+            # the pool keeps its opening-hours index until it grows again
+            if pool.get("hours_index") is None:
+                pool["hours_index"] = OpeningHoursIndex(pool["items"])
+            matches = filter_by_dining_time(pool["items"], dining_time, day, index=pool["hours_index"])
+        else:
+            matches = pool["items"]
+        if len(matches) >= limit or pool["exhausted"] or pool["next_from"] >= MAX_CANDIDATES:
+            break
+
+        size = min(fetch_size, MAX_CANDIDATES - pool["next_from"])
+        restaurant_ids = aoss_query(cuisine, size, start=pool["next_from"], seed=pool["seed"], origin=origin)
+        pool["next_from"] += len(restaurant_ids)
+        pool["exhausted"] = len(restaurant_ids) < size
+        pool["items"] = batch_get_restaurants(cuisine, restaurant_ids) + pool["items"]
+        pool["hours_index"] = None
+        pool["columns"] = None
+        fetch_size *= 2
+        grown = True
+
+    # the ranking columns are also kept with the pool until it grows again
+    if pool.get("columns") is None:
+        pool["columns"] = Columns(pool["items"])
+    columns = pool["columns"]
+    idx = None if matches is pool["items"] else [columns.pos[r.business_id] for r in matches]
+    if seed is not None and len(matches) > limit:
+        best = columns.top_k(limit * OVERFETCH_FACTOR, origin, idx=idx)
+        picked = sorted(random.Random(f"{cuisine}:{seed}").sample(range(len(best)), limit))
+        ranked = [best[i] for i in picked]
+    else:
+        ranked = columns.top_k(limit, origin, idx=idx)
 
+    if grown:
+        index = pool.get("hours_index")
+        size = sum(r.approx_size() for r in pool["items"]) + (index.approx_size() if index else 0) + 40 * len(columns)
+        cache.put(key, pool, size=size)
+    return ranked
 
-    return {
-        "statusCode": 200,
-        "body": json.dumps(
-            {
-                "count": len(restaurants),
-                "sample": restaurants[:3],
-            },
-            default=str,
-        ),
-    }
 
-# def query_top_by_cuisine(cuisine: str, restaurant_ids: List[str], limit: int, min_rating: float | None):
-#     cuisine = html.escape(cuisine.lower())
-#     key_cond = Key("cuisine").eq(cuisine) & Key("business_id").is_in(restaurant_ids)
-#     if min_rating is not None:
-#         key_cond = key_cond & Key("rating").gte(to_decimal(min_rating))
-
-#     kwargs = {
-#         "IndexName": CUISINE_INDEX,
-#         "KeyConditionExpression": key_cond,
-#         "ProjectionExpression": "#id, #n, address, rating, cuisine, business_hours, #l, zip_code, price, review_count, coordinates",
-#         "ExpressionAttributeNames": {
-#             "#id": "business_id",
-#             "#n": "name",
-#             "#l": "location",
-#         },
-#         "ScanIndexForward": False,
-#         "Limit": limit,
-#     }
-
-#     resp = table.query(**kwargs)
-#     return resp.get("Items", [])
-
-def query_top_by_cuisine(cuisine: str, restaurant_ids: List[str], limit: int, min_rating: float | None):
-    if not restaurant_ids:
-        return []
+def leaderboard_lookup(cuisine: str, limit: int, dining_time: str | None = None, day: int | None = None,
+                       seed: int | None = None, cache: RestaurantCache = restaurant_cache) -> list[Restaurant] | None:
+    """
+    Top `limit` restaurants from the cuisine's leaderboard (its hour-of-week board when a
+    dining time is given), or None when the boards are not yet current for the catalog
+    version, there is no board, or too few of its restaurants are open to answer. With a
+    `seed`, `limit` of the open board entries are sampled, keeping their rank order.
+    """
+    if cache.version is None or cache.leaderboards_version != cache.version:
+        return None
+    minute = minute_of_week(day or 0, dining_time) if dining_time else None
+    hour = minute // 60 if minute is not None and LEADERBOARD_HOURS else None
+    key = ("leaderboard", cuisine, hour)
+    board = cache.get(key)
+    if board is None:
+        try:
+            with span("LeaderboardGet"):
+                item = get_table().get_item(Key=leaderboard_key(cuisine, hour)).get("Item")
+        except ClientError as e:
+            log("WARN", f"Could not read leaderboard {cuisine}/{hour}: {e.response['Error']['Message']}")
+            return None
+        if not item:
+            return None
+        board = {"restaurants": read_board(item), "complete": bool(item.get("complete"))}
+        cache.put(key, board, size=sum(r.approx_size() for r in board["restaurants"]))
 
-    cuisine = html.escape(cuisine.lower())
-    keys = [{"cuisine": {"S": cuisine}, "business_id": {"S": rid}} for rid in restaurant_ids[:10]]
-    resp = client.batch_get_item(RequestItems={TABLE_NAME: {"Keys": keys}})
+    restaurants = board["restaurants"]
+    if minute is not None:
+        restaurants = [r for r in restaurants if any(lo <= minute < hi for lo, hi in r.open_intervals)]
+    if len(restaurants) < limit and not board["complete"]:
+        return None
+    if seed is not None and len(restaurants) > limit:
+        picked = sorted(random.Random(f"{cuisine}:{seed}").sample(range(len(restaurants)), limit))
+        return [restaurants[i] for i in picked]
+    return restaurants[:limit]
 
-    items = resp.get("Responses", {}).get(TABLE_NAME, [])
-    restaurants = [{k: val_of(v) for k, v in item.items()} for item in items]
 
-    if min_rating is not None:
-        restaurants = [r for r in restaurants if float(r.get("rating", 0)) >= min_rating]
+def claim_message(msg_id: str, body: str | None):
+    """
+    (idempotency key, earlier stages) for a message, or None when there is no store.
+    Raises AlreadyInProgress while another invocation holds the message; a store
+    that cannot be reached does not block delivery.
+    """
+    if idempotency is None or not msg_id:
+        return None
+    key = idempotency_key(msg_id, body)
+    try:
+        return key, idempotency.start(key)
+    except AlreadyInProgress:
+        raise
+    except Exception as e:
+        log("WARN", f"Idempotency store unavailable, processing {msg_id} without it: {e}")
+        return None
 
-    restaurants.sort(key=lambda r: float(r.get("rating", 0)), reverse=True)
 
-    return restaurants[:limit]
-def aoss_query(cuisine: str, limit: int):
-    cuisine = html.escape(cuisine.lower())
-    query = {
-        "size": limit,
-        "query": {
-            "query_string": {
-                "default_field": "cuisine",
-                "query": cuisine,
-            }
-        },
-    }
-    resp = client.search(index=AOSS_INDEX, body=query)
-    return [hit["_source"] for hit in resp["hits"]["hits"]]
+def record_stages(claim, stages, release: bool = False, **fields):
+    try:
+        idempotency.record(claim[0], stages, release=release, **fields)
+    except Exception as e:
+        log("WARN", f"Could not record stages {sorted(stages)} for {claim[0]}: {e}")
 
-    
-def filter_by_dining_time(items: list[dict], dining_time: str) -> list[dict]:
-    target = _hhmm_to_minutes(dining_time)
 
-    def open_now(hours_obj) -> bool:
-        if not hours_obj:
-            return False
+def restaurants_by_id(cuisine: str, restaurant_ids: List[str], snapshot: CatalogSnapshot | None = None) -> list[Restaurant]:
+    """Records for `restaurant_ids` in their given order; ids no longer in the catalog are dropped."""
+    if snapshot is not None and cuisine in snapshot.columns:
+        columns = snapshot.columns[cuisine]
+        return [columns.restaurants[columns.pos[rid]] for rid in restaurant_ids if rid in columns.pos]
+    found = {r.business_id: r for r in batch_get_restaurants(cuisine, restaurant_ids)} if restaurant_ids else {}
+    return [found[rid] for rid in restaurant_ids if rid in found]
 
-        windows = []
-        if isinstance(hours_obj, dict) and "start" in hours_obj and "end" in hours_obj:
-            windows = [hours_obj]
-        elif isinstance(hours_obj, (list, tuple)):
-            windows = hours_obj
-        else:
-            return False
 
-        for w in windows:
-            start_raw = extract_hhmm(w.get("start"))
-            end_raw = extract_hhmm(w.get("end"))
-            if not start_raw or not end_raw:
+def lambda_handler(event, context):
+    # SQS batch: {"Records": [{"messageId": "...", "body": "{...}"}, ...]}
+    # body:
+    # {
+    #   "Location":"New York",
+    #   "Cuisine":"italian",
+    #   "DiningTime":"19:00",
+    #   "NumPeople":"5",
+    #   "Email":"abc@abc.com",
+    #   "SessionId":"..."
+    # }
+    records = event.get("Records", []) if isinstance(event, dict) else event
+    failures = []
+    claims = {}  # msg_id -> (idempotency key, stages completed by earlier attempts)
+    duplicates = 0
+    hits, misses = restaurant_cache.hits, restaurant_cache.misses
+
+    by_cuisine = {}
+    for record in records:
+        msg_id = record.get("messageId")
+        try:
+            msg = json.loads(record.get("body") or "{}")
+        except json.JSONDecodeError as e:
+            print(f"[ERROR] Message {msg_id} body is not valid JSON: {e}")
+            failures.append(msg_id)
+            continue
+
+        cuisine = (msg.get("Cuisine") or "").lower()
+        if not cuisine or not (msg.get("Email") or (RESULTS_TABLE and msg.get("SessionId"))):
+            print(f"[ERROR] Message {msg_id} is missing Cuisine or a destination (Email/SessionId)")
+            failures.append(msg_id)
+            continue
+
+        try:
+            claim = claim_message(msg_id, record.get("body"))
+        except AlreadyInProgress:
+            log("WARN", f"Message {msg_id} is being processed by another invocation, retrying later")
+            failures.append(msg_id)
+            continue
+        if claim is not None:
+            if STAGE_DONE in claim[1]["stages"]:
+                log("INFO", f"Message {msg_id} was already delivered, skipping")
+                duplicates += 1
                 continue
-            start = _hhmm_to_minutes(start_raw)
-            end = _hhmm_to_minutes(end_raw)
-
-            if start == end:
+            claims[msg_id] = claim
+        by_cuisine.setdefault(cuisine, []).append((msg_id, msg))
+
+    snapshot = None
+    board_lookups = resumed = 0
+    if by_cuisine:
+        refresh_catalog_version()
+        snapshot = current_snapshot(restaurant_cache.version)
+        day = dining_weekday()
+
+    # messages that end up with the same restaurants share one rendered email
+    result_sets = {}
+    for cuisine, batch in by_cuisine.items():
+        # messages of one cuisine share the cached candidate pool whatever their seed, so
+        # the remote lookup runs for the first of them and again only when a dining time
+        # filters out too many of the pool's restaurants
+        for msg_id, msg in batch:
+            claim = claims.get(msg_id)
+            try:
+                if claim is not None and STAGE_LOOKED_UP in claim[1]["stages"]:
+                    # a retry: deliver what the first attempt found instead of looking up again
+                    restaurants = restaurants_by_id(cuisine, claim[1]["restaurant_ids"], snapshot)
+                    resumed += 1
+                else:
+                    origin = resolve_location(msg.get("Location"), snapshot.zip_centroids if snapshot is not None else None)
+                    if snapshot is not None:
+                        restaurants = snapshot.query(
+                            cuisine, DEFAULT_LIMIT, msg.get("DiningTime"), day, seed=sampling_seed(msg),
+                            fetch_size=DEFAULT_LIMIT * OVERFETCH_FACTOR, max_candidates=MAX_CANDIDATES, origin=origin,
+                        )
+                    else:
+                        # boards are ranked without distance, so located requests take the remote path
+                        restaurants = leaderboard_lookup(
+                            cuisine, DEFAULT_LIMIT, msg.get("DiningTime"), day, seed=sampling_seed(msg),
+                        ) if LEADERBOARDS and origin is None else None
+                        if restaurants is None:
+                            restaurants = lookup_restaurants(
+                                cuisine, DEFAULT_LIMIT, msg.get("DiningTime"), day, seed=sampling_seed(msg), origin=origin,
+                            )
+                        else:
+                            board_lookups += 1
+                    if claim is not None:
+                        record_stages(claim, {STAGE_LOOKED_UP}, restaurant_ids=[r.business_id for r in restaurants])
+            except Exception as e:
+                print(f"[ERROR] Message {msg_id} failed: {e}")
+                failures.append(msg_id)
+                if claim is not None:
+                    record_stages(claim, set(), release=True)
+                continue
+            log("DEBUG", f"Found {len(restaurants)} restaurants for cuisine={cuisine} at time={msg.get('DiningTime')}")
+            ids = tuple(r.business_id for r in restaurants)
+            result_sets.setdefault(ids, (restaurants, []))[1].append((msg_id, msg))
+
+    # results go to the chat's store first, so the UI does not wait on SES; a message
+    # is delivered once any of its channels succeeded
+    sent = stored = 0
+    for restaurants, batch in result_sets.values():
+        delivered = set()
+        attempted = set()
+        completed = {msg_id: set() for msg_id, _ in batch}  # stages finished in this attempt
+
+        def done_before(msg_id, stage):
+            if msg_id in claims and stage in claims[msg_id][1]["stages"]:
+                delivered.add(msg_id)
                 return True
+            return False
 
-            if start < end:
-                if start <= target < end:
-                    return True
-            else:
-                if target >= start or target < end:
-                    return True
-        return False
-
-    return [it for it in items if open_now(it.get("business_hours"))]
-
+        if RESULTS_TABLE:
+            chat_batch = [(msg_id, msg) for msg_id, msg in batch
+                          if msg.get("SessionId") and not done_before(msg_id, STAGE_STORED)]
+            attempted.update(msg_id for msg_id, _ in chat_batch)
+            if chat_batch and store_results(chat_batch, restaurants):
+                delivered.update(msg_id for msg_id, _ in chat_batch)
+                for msg_id, _ in chat_batch:
+                    completed[msg_id].add(STAGE_STORED)
+                stored += len(chat_batch)
+
+        email_batch = [(msg_id, msg) for msg_id, msg in batch
+                       if msg.get("Email") and not done_before(msg_id, STAGE_EMAILED)] if EMAIL_RESULTS else []
+        attempted.update(msg_id for msg_id, _ in email_batch)
+        if email_batch:
+            try:
+                results = send_bulk_recommendations_email(
+                    sender=SENDER,
+                    recipients=[msg["Email"] for _, msg in email_batch],
+                    subject="Your dining suggestions",
+                    intro_text="Here are the best-rated options that match your request:",
+                    restaurants=restaurants,
+                    ses_region="us-east-1",
+                )
+            except Exception as e:
+                print(f"[ERROR] Email delivery failed for {len(email_batch)} messages: {e}")
+                results = [(None, str(e))] * len(email_batch)
+
+            for (msg_id, _), (ses_id, error) in zip(email_batch, results):
+                if error:
+                    print(f"[ERROR] Message {msg_id} email failed: {error}")
+                else:
+                    log("DEBUG", f"SES MessageId: {ses_id}")
+                    delivered.add(msg_id)
+                    completed[msg_id].add(STAGE_EMAILED)
+                    sent += 1
+
+        for msg_id, _ in batch:
+            if msg_id not in delivered:
+                if msg_id not in attempted:
+                    print(f"[ERROR] Message {msg_id} has no enabled delivery channel")
+                failures.append(msg_id)
+            if msg_id in claims:
+                record_stages(claims[msg_id], completed[msg_id] | ({STAGE_DONE} if msg_id in delivered else set()),
+                              release=True)
+
+    log("INFO", f"Processed {len(records)} messages: stored={stored} sent={sent} failed={len(failures)}")
+    stats = restaurant_cache.stats()
+    count("MessagesReceived", len(records))
+    count("MessagesSent", sent)
+    count("ResultsStored", stored)
+    count("MessagesFailed", len(failures))
+    count("CacheHits", stats["hits"] - hits)
+    count("CacheMisses", stats["misses"] - misses)
+    count("LeaderboardLookups", board_lookups)
+    count("DuplicatesSkipped", duplicates)
+    count("RetriesResumed", resumed)
+    count("SnapshotLookups", sum(len(batch) for batch in by_cuisine.values()) if snapshot is not None else 0)
+    aws_clients.report_cold_start()
+    flush("LF2", cache=stats)
+
+    # only the failed messages go back to the queue (ReportBatchItemFailures)
+    return {
+        "batchItemFailures": [{"itemIdentifier": msg_id} for msg_id in failures if msg_id]
+    }
 
-def extract_hhmm(val) -> str | None:
-    if val is None:
-        return None
-    if isinstance(val, dict) and "S" in val:
-        return val["S"]
-    return str(val)
 
+def batch_get_restaurants(cuisine: str, restaurant_ids: List[str], dynamo=None) -> list[Restaurant]:
+    """BatchGetItem in chunks of 100 keys, retrying UnprocessedKeys with backoff."""
+    if not restaurant_ids:
+        return []
+    dynamo = dynamo or get_dynamodb()
 
-def _hhmm_to_minutes(hhmm: str) -> int:
-    s = hhmm.strip()
-    if ":" in s:
-        h, m = s.split(":")
-    else:
-        h, m = s[:2], s[2:]
-    return int(h) * 60 + int(m)
+    cuisine = html.escape(cuisine.lower())
+    ids = list(dict.fromkeys(restaurant_ids))  # BatchGetItem rejects duplicate keys
+    restaurants = []
+    for i in range(0, len(ids), BATCH_GET_CHUNK):
+        request = {
+            TABLE_NAME: {
+                "Keys": [{"cuisine": {"S": cuisine}, "business_id": {"S": rid}} for rid in ids[i:i + BATCH_GET_CHUNK]],
+                "ProjectionExpression": RESTAURANT_PROJECTION,
+                "ExpressionAttributeNames": RESTAURANT_PROJECTION_NAMES,
+            }
+        }
+        for attempt in range(BATCH_GET_MAX_RETRIES + 1):
+            with span("DynamoBatchGetItem"):
+                resp = dynamo.batch_get_item(RequestItems=request)
+            restaurants.extend(Restaurant.from_wire(item) for item in resp.get("Responses", {}).get(TABLE_NAME, []))
+            request = resp.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            if attempt == BATCH_GET_MAX_RETRIES:
+                missing = len(request.get(TABLE_NAME, {}).get("Keys", []))
+                raise RuntimeError(f"BatchGetItem left {missing} keys unprocessed after {attempt + 1} attempts")
+            time.sleep(0.05 * (2 ** attempt))
+
+    return restaurants
+
+
+def aoss_query(cuisine: str, limit: int, start: int = 0, search=None, seed: int | None = None,
+               origin: tuple[float, float] | None = None) -> list[str]:
+    """
+    Restaurant ids for a cuisine; `_source` filtering keeps the response to ids only.
+    A `seed` replaces the score with a seeded `random_score`, so paging with the same
+    seed walks one stable shuffle of the cuisine. An `origin` sorts by distance from it
+    on the indexed `location` instead, so paging walks outwards from the nearest.
+    """
+    search = search or get_search_client()
+    query = {"term": {AOSS_CUISINE_FIELD: cuisine.lower()}}
+    if seed is not None and origin is None:
+        query = {
+            "function_score": {
+                "query": query,
+                "random_score": {"seed": seed, "field": AOSS_RANDOM_FIELD},
+                "boost_mode": "replace",
+            }
+        }
+    body = {
+        "from": start,
+        "size": limit,
+        "_source": ["restaurant_id"],
+        "query": query,
+    }
+    if origin is not None:
+        # documents indexed before `location` existed sort last instead of failing the query
+        body["sort"] = [{"_geo_distance": {
+            "location": {"lat": origin[0], "lon": origin[1]}, "order": "asc", "unit": "km", "ignore_unmapped": True,
+        }}]
+    with span("OpenSearchSearch"):
+        resp = search.search(index=AOSS_INDEX, body=body)
+    return [hit.get("_source", {}).get("restaurant_id") or hit["_id"] for hit in resp["hits"]["hits"]]
+
+
+def filter_by_dining_time(items: list[dict], dining_time: str, day: int | None = None,
+                          index: OpeningHoursIndex | None = None) -> list[dict]:
+    """Keep the items open at `dining_time` on `day` (0 = Monday, default today)."""
+    if day is None:
+        day = dining_weekday()
+    index = index or OpeningHoursIndex(items)
+    open_ids = index.open_at(minute_of_week(day, dining_time))
+    return [it for it in items if (it.get("business_id") if isinstance(it, dict) else it.business_id) in open_ids]
+
+
+def dining_weekday() -> int:
+    return datetime.datetime.now(ZoneInfo(DINING_TIMEZONE)).weekday()
+
+
+def store_results(batch, restaurants) -> bool:
+    """Write the finished recommendations for each message's session to the results store."""
+    now = time.time()
+    rows = [{"business_id": r.business_id, "name": r.display["name"], "address": r.display["address"],
+             "rating": r.display["rating"], "hours": r.display["hours_text"]} for r in restaurants]
+    try:
+        with span("DynamoPutResults"), get_results_table().batch_writer(overwrite_by_pkeys=["session_id"]) as writer:
+            for msg_id, msg in batch:
+                writer.put_item(Item={
+                    "session_id": msg["SessionId"],
+                    "created_at": int(now * 1000),
+                    "expires_at": int(now) + RESULTS_TTL_SECONDS,
+                    "message_id": msg_id,
+                    "cuisine": (msg.get("Cuisine") or "").lower(),
+                    "location": msg.get("Location") or "",
+                    "dining_time": msg.get("DiningTime") or "",
+                    "num_people": str(msg.get("NumPeople") or ""),
+                    "restaurants": rows,
+                })
+        return True
+    except Exception as e:
+        print(f"[ERROR] Failed to store results for {len(batch)} sessions: {e}")
+        return False
 
 
 def to_decimal(x):
@@ -196,7 +669,31 @@ def to_decimal(x):
     return Decimal(str(x))
 
 
-def send_restaurant_recommendations_email(
+def ensure_email_template(ses) -> str:
+    """Create the pass-through SES template once per container if it does not exist yet."""
+    global _email_template_ready
+    if _email_template_ready:
+        return SES_TEMPLATE_NAME
+    try:
+        ses.get_template(TemplateName=SES_TEMPLATE_NAME)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TemplateDoesNotExist":
+            raise RuntimeError(f"SES get_template failed: {e.response['Error']['Message']}")
+        try:
+            ses.create_template(Template={
+                "TemplateName": SES_TEMPLATE_NAME,
+                "SubjectPart": "{{subject}}",
+                "HtmlPart": "{{{html_body}}}",
+                "TextPart": "{{{text_body}}}",
+            })
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "AlreadyExists":
+                raise RuntimeError(f"SES create_template failed: {e.response['Error']['Message']}")
+    _email_template_ready = True
+    return SES_TEMPLATE_NAME
+
+
+def send_bulk_recommendations_email(
     *,
     sender: str,
     recipients: list[str],
@@ -205,34 +702,62 @@ def send_restaurant_recommendations_email(
     restaurants: list[dict],
     ses_region: str | None = None,
     reply_to: list[str] | None = None,
-) -> str:
+) -> list[tuple[str | None, str | None]]:
     """
-    Sends a formatted email via Amazon SES:
-      - intro_text line
-      - table of Name | Address | Rating | Business Hours
-    Returns SES MessageId.
+    Sends the same recommendations to many recipients with SES templated bulk sending.
+    The email is rendered once and passed as default template data; recipients go out
+    in chunks of 50, and throttled destinations are retried with backoff. A chunk SES
+    rejects outright only fails its own recipients.
+    Returns one (MessageId, error) pair per recipient, in order.
     """
-    ses = boto3.client("ses", region_name=ses_region or os.getenv("SES_REGION") or "us-east-1")
-
-    html_body = build_html_email(intro_text, restaurants)
-    text_body = build_text_email(intro_text, restaurants)
-
-    try:
-        resp = ses.send_email(
-            Source=sender,
-            Destination={"ToAddresses": recipients},
-            Message={
-                "Subject": {"Data": subject, "Charset": "UTF-8"},
-                "Body": {
-                    "Text": {"Data": text_body, "Charset": "UTF-8"},
-                    "Html": {"Data": html_body, "Charset": "UTF-8"},
-                },
-            },
-            ReplyToAddresses=reply_to or [],
-        )
-        return resp["MessageId"]
-    except ClientError as e:
-        raise RuntimeError(f"SES send_email failed: {e.response['Error']['Message']}")
+    ses = aws_clients.client("ses", ses_region or os.getenv("SES_REGION") or "us-east-1")
+    template = ensure_email_template(ses)
+    default_data = json.dumps({
+        "subject": subject,
+        "html_body": build_html_email(intro_text, restaurants),
+        "text_body": build_text_email(intro_text, restaurants),
+    })
+
+    results = [(None, None)] * len(recipients)
+    for start in range(0, len(recipients), SES_BULK_MAX_DESTINATIONS):
+        pending = list(range(start, min(start + SES_BULK_MAX_DESTINATIONS, len(recipients))))
+        for attempt in range(SES_MAX_RETRIES + 1):
+            try:
+                with span("SesSendBulkTemplatedEmail"):
+                    resp = ses.send_bulk_templated_email(
+                        Source=sender,
+                        Template=template,
+                        DefaultTemplateData=default_data,
+                        Destinations=[
+                            {"Destination": {"ToAddresses": [recipients[i]]}, "ReplacementTemplateData": "{}"}
+                            for i in pending
+                        ],
+                        ReplyToAddresses=reply_to or [],
+                    )
+            except ClientError as e:
+                if e.response["Error"]["Code"] in SES_THROTTLE_CODES and attempt < SES_MAX_RETRIES:
+                    time.sleep(0.2 * (2 ** attempt))
+                    continue
+                # only this chunk failed; earlier chunks were sent and later ones still go out
+                error = f"SES send_bulk_templated_email failed: {e.response['Error']['Message']}"
+                for i in pending:
+                    results[i] = (None, error)
+                break
+
+            retry = []
+            for i, status in zip(pending, resp.get("Status", [])):
+                if status.get("Status") == "Success":
+                    results[i] = (status.get("MessageId"), None)
+                elif status.get("Status") in SES_RETRY_STATUSES and attempt < SES_MAX_RETRIES:
+                    retry.append(i)
+                else:
+                    results[i] = (None, f"{status.get('Status')}: {status.get('Error')}")
+            if not retry:
+                break
+            pending = retry
+            time.sleep(0.2 * (2 ** attempt))
+
+    return results
 
 # ========== Email body builders =============================================
 
@@ -260,21 +785,38 @@ Sent via Amazon SES""".strip()
 
 # ========== Table/row builders ==============================================
 
-def build_restaurants_html(restaurants: list[dict]) -> str:
-    rows = []
-    for r in restaurants:
-        name = html.escape(str(val_of(r.get("name")) or "N/A"))
-        address = html.escape(build_address(r))
-        rating = html.escape(format_rating(r.get("rating")))
-        _, hours_html = format_business_hours(r.get("business_hours"))
-
-        rows.append(f"""\
+def render_rows(r: Restaurant | dict) -> tuple[str, str]:
+    """(html_row, text_row) for one restaurant, from the row cache when possible."""
+    if isinstance(r, dict):
+        r = Restaurant.from_item(r)
+    key = (r.business_id, restaurant_cache.version)
+    rows = row_cache.get(key) if key[0] else None
+    if rows is not None:
+        return rows
+
+    # items written by YelpFetch carry a precomputed display projection
+    d = r.display
+    html_row = f"""\
 <tr>
-  <td style="padding:8px;border:1px solid #e5e7eb">{name}</td>
-  <td style="padding:8px;border:1px solid #e5e7eb;white-space:pre-line">{address}</td>
-  <td style="padding:8px;border:1px solid #e5e7eb;text-align:center">{rating}</td>
-  <td style="padding:8px;border:1px solid #e5e7eb">{hours_html}</td>
-</tr>""")
+  <td style="padding:8px;border:1px solid #e5e7eb">{html.escape(d["name"])}</td>
+  <td style="padding:8px;border:1px solid #e5e7eb;white-space:pre-line">{html.escape(d["address"])}</td>
+  <td style="padding:8px;border:1px solid #e5e7eb;text-align:center">{html.escape(d["rating"])}</td>
+  <td style="padding:8px;border:1px solid #e5e7eb">{d["hours_html"]}</td>
+</tr>"""
+    text_row = (
+        f"Name: {d['name']}\n"
+        f"Address: {d['address']}\n"
+        f"Rating: {d['rating']}\n"
+        f"Hours: {d['hours_text']}\n"
+        + ("-" * 40)
+    )
+    rows = (html_row, text_row)
+    if key[0]:
+        row_cache.put(key, rows)
+    return rows
+
+def build_restaurants_html(restaurants: list[dict]) -> str:
+    rows = [render_rows(r)[0] for r in restaurants]
 
     return f"""\
 <table cellpadding="0" cellspacing="0" width="100%" style="border-collapse:collapse;font:14px Arial,Helvetica,sans-serif">
@@ -292,116 +834,7 @@ def build_restaurants_html(restaurants: list[dict]) -> str:
 </table>""".strip()
 
 def build_restaurants_text(restaurants: list[dict]) -> str:
-    lines = []
-    for r in restaurants:
-        name = str(val_of(r.get("name")) or "N/A")
-        address = build_address(r)
-        rating = format_rating(r.get("rating"))
-        hours_text, _ = format_business_hours(r.get("business_hours"))
-        lines.append(
-            f"Name: {name}\n"
-            f"Address: {address}\n"
-            f"Rating: {rating}\n"
-            f"Hours: {hours_text}\n"
-            + ("-" * 40)
-        )
-    return "\n".join(lines)
-
-def val_of(x):
-    """Return plain Python value from DynamoDB attribute or raw value."""
-    if isinstance(x, dict) and len(x) == 1 and next(iter(x)) in {"S", "N", "BOOL"}:
-        t, v = next(iter(x.items()))
-        if t == "N":
-            try:
-                return Decimal(v)
-            except Exception:
-                return v
-        return v
-    return x
-
-def get_attr(d: dict, *path, default=None):
-    """Safe nested getter supporting DynamoDB-export shapes."""
-    cur = d
-    for p in path:
-        if cur is None:
-            return default
-        cur = cur.get(p)
-    return val_of(cur) if cur is not None else default
-
-def build_address(r: dict) -> str:
-    # Use 'address' if already flattened; else compose from location + zip
-    addr = val_of(r.get("address"))
-    if addr:
-        return str(addr)
-
-    a1 = get_attr(r, "location", "address1") or ""
-    a2 = get_attr(r, "location", "address2") or ""
-    city = get_attr(r, "location", "city") or ""
-    state = get_attr(r, "location", "state") or ""
-    zipc = val_of(r.get("zip_code")) or get_attr(r, "location", "zip_code") or ""
-
-    parts = [p for p in [a1, a2] if p]
-    citystate = ", ".join(p for p in [city, state] if p)
-    if citystate:
-        parts.append(citystate)
-    if zipc:
-        parts.append(str(zipc))
-    return ", ".join(parts) or "N/A"
-
-def format_rating(r) -> str:
-    r = val_of(r)
-    if isinstance(r, Decimal):
-        return f"{float(r):.1f}"
-    try:
-        return f"{float(r):.1f}"
-    except Exception:
-        return str(r) if r is not None else "N/A"
+    return "\n".join(render_rows(r)[1] for r in restaurants)
 
-def extract_hhmm(val) -> str | None:
-    if val is None:
-        return None
-    if isinstance(val, dict) and "S" in val:  # export-style {"S":"0700"}
-        val = val["S"]
-    s = str(val).strip()
-    return s if s else None
-
-def format_hhmm(s: str) -> str:
-    s = str(s).strip()
-    if ":" in s:
-        hh, mm = s.split(":")
-    else:
-        hh, mm = s[:2], s[2:4] if len(s) >= 4 else "00"
-    return f"{int(hh):02d}:{int(mm):02d}"
-
-def format_business_hours(hours):
-    """
-    Accepts:
-      • dict: {"start": "0700", "end": "2300"}   (or {"start":{"S":"0700"}})
-      • list of such dicts (multiple windows)
-    Returns (text_version, html_version) like '07:00–23:00'. start==end → 'Open 24 hours'.
-    """
-    if not hours:
-        return ("Not provided", "Not provided")
 
-    def window_to_str(win: dict) -> str | None:
-        s_raw = extract_hhmm(win.get("start"))
-        e_raw = extract_hhmm(win.get("end"))
-        if not s_raw or not e_raw:
-            return None
-        if s_raw == e_raw:
-            return "Open 24 hours"
-        return f"{format_hhmm(s_raw)}–{format_hhmm(e_raw)}"
-
-    windows = []
-    if isinstance(hours, dict) and ("start" in hours or "end" in hours):
-        windows = [hours]
-    elif isinstance(hours, (list, tuple)):
-        windows = [w for w in hours if isinstance(w, dict)]
-
-    out = [w for w in (window_to_str(w) for w in windows) if w]
-    if not out:
-        return ("Not provided", "Not provided")
-
-    text = "\n".join(out)
-    html_lines = "<br>".join(html.escape(line) for line in out)
-    return (text, html_lines)
\ No newline at end of file
+aws_clients.record_import("LF2", _IMPORT_STARTED)
@@ -1,10 +1,15 @@
 import json
-import requests
 import os
-import boto3
-from models import RestaurantList
-from pydantic import ValidationError
-from decimal import Decimal
+import aws_clients
+from catalog_snapshot import build_snapshot, write_snapshot
+from leaderboard import PARTITION_PREFIX, build_leaderboards, leaderboard_partition
+from opensearch_bulk import ActionFile, BulkIndexer, ensure_index, search_document
+from instrumentation import count, flush, log, log_enabled
+import datetime
+import hashlib
+from yelp_ingest import Checkpoint, iter_pages, iter_shard_pages, shard_key
+from yelp_records import BusinessValidator, InvalidRecord, Quarantine
+from restaurant_record import Restaurant
 from collections import Counter
 
 YELP_API_KEY = os.environ.get("YELP_API_KEY", "")
@@ -13,131 +18,472 @@ if not YELP_API_KEY:
     exit(1)
 
 TABLE_NAME = os.environ.get("TABLE_NAME", "yelp-restaurants")
+# LF2 clears its warm cache whenever this item changes
+CATALOG_META_KEY = {"cuisine": "__meta__", "business_id": "catalog_version"}
 cuisine_list = {"chinese", "japanese", "italian", "mexican", "american"}
+# "incremental" only writes new/changed items and deletes vanished ones; "full" rewrites everything
+SYNC_MODE = os.environ.get("SYNC_MODE", "incremental")
+AOSS_INDEX = os.environ.get("AOSS_INDEX", "restaurant_index")
+# Index changes are bulk-sent to this collection; without one they are written to SYNC_ACTIONS_PATH
+AOSS_HOST = os.environ.get("AOSS_HOST", "")
+AOSS_REGION = os.environ.get("AOSS_REGION", os.environ.get("AWS_REGION", "us-east-1"))
+# Unsigned cluster URL (e.g. http://localhost:9200 for a local OpenSearch); wins over AOSS_HOST
+OPENSEARCH_URL = os.environ.get("OPENSEARCH_URL", "")
+SYNC_ACTIONS_PATH = os.environ.get("SYNC_ACTIONS_PATH", "/tmp/opensearch-actions.jsonl")
+# Comma-separated Yelp locations; each (location, cuisine) pair is one shard
+LOCATIONS = [l.strip() for l in os.environ.get("LOCATIONS", "Brooklyn").split(",") if l.strip()]
+# Local checkpoint file for offline runs; the checkpoint lives in the table otherwise
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "")
+# Stop scheduling pages when the invocation has less than this left
+DEADLINE_MARGIN_MS = int(os.environ.get("DEADLINE_MARGIN_MS", "60000"))
+# Local path or s3:// URL of the catalog snapshot LF2 loads in embedded mode; empty = none
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT", "")
+# Records that fail validation go to this table if set, else to the JSON-lines file
+QUARANTINE_TABLE = os.environ.get("QUARANTINE_TABLE", "")
+QUARANTINE_PATH = os.environ.get("QUARANTINE_PATH", "/tmp/yelp-quarantine.jsonl")
+# Precomputed per-cuisine (and per hour-of-week) top-N items for LF2's single-GetItem path
+LEADERBOARDS = os.environ.get("LEADERBOARDS", "false").lower() == "true"
 
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(TABLE_NAME)
+validate_business = BusinessValidator(cuisine_list)
+quarantine = Quarantine(QUARANTINE_PATH, QUARANTINE_TABLE)
+
+
+def get_table():
+    return aws_clients.table(TABLE_NAME)
 
 def write_to_dynamo_db(data):
-    """Write validated items to DynamoDB with error handling."""
+    """Write validated items to DynamoDB with error handling. Accepts any iterable, including generators."""
+    written = 0
     try:
-        with table.batch_writer() as batch:
+        with get_table().batch_writer() as batch:
             for i, item in enumerate(data):
                 try:
                     batch.put_item(Item=item)
-                    print(f"[INFO] item number: {i}, Inserted item: {item['business_id']} ({item['name']})")
+                    written += 1
+                    log("DEBUG", f"item number: {i}, Inserted item: {item['business_id']} ({item['name']})", sampled=True)
                 except Exception as inner_e:
                     print(f"[ERROR] Failed to insert item {item.get('business_id')}: {inner_e}")
-        return True
+        return True, written
     except Exception as e:
         print(f"[ERROR] Batch write failed: {e}")
-        return False
+        return False, written
+
+
+def write_catalog_version():
+    """Stamp the table with a new catalog version so LF2 drops stale cached results."""
+    version = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    try:
+        get_table().put_item(Item={**CATALOG_META_KEY, "version": version})
+        log("INFO", f"Catalog version set to {version}")
+    except Exception as e:
+        print(f"[ERROR] Failed to write catalog version: {e}")
+    return version
+
+
+def is_bookkeeping(item):
+    return item["cuisine"] == CATALOG_META_KEY["cuisine"] or item["cuisine"].startswith(PARTITION_PREFIX)
+
+
+def scan_catalog():
+    """Yield every restaurant item in the table, skipping the __meta__ and leaderboard items."""
+    kwargs = {}
+    while True:
+        resp = get_table().scan(**kwargs)
+        for it in resp.get("Items", []):
+            if not is_bookkeeping(it):
+                yield it
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def publish_snapshot(version, catalog=None):
+    """Write the whole catalog, stamped with `version`, to CATALOG_SNAPSHOT for LF2's embedded mode."""
+    try:
+        built_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        data = build_snapshot(scan_catalog() if catalog is None else catalog, version, built_at)
+        write_snapshot(data, CATALOG_SNAPSHOT)
+        log("INFO", f"Catalog snapshot {version} ({len(data)} bytes) written to {CATALOG_SNAPSHOT}")
+    except Exception as e:
+        print(f"[ERROR] Failed to write catalog snapshot: {e}")
+
+
+def load_board_hashes(cuisines):
+    """(partition, business_id) -> content_hash of the stored leaderboard items of `cuisines`."""
+    hashes = {}
+    for cuisine in cuisines:
+        kwargs = {
+            "KeyConditionExpression": "#c = :c",
+            "ProjectionExpression": "#c, #id, #h",
+            "ExpressionAttributeNames": {"#c": "cuisine", "#id": "business_id", "#h": "content_hash"},
+            "ExpressionAttributeValues": {":c": leaderboard_partition(cuisine)},
+        }
+        while True:
+            resp = get_table().query(**kwargs)
+            for it in resp.get("Items", []):
+                hashes[(it["cuisine"], it["business_id"])] = it.get("content_hash")
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    return hashes
+
+
+def publish_leaderboards(version, catalog=None):
+    """
+    Rewrite the leaderboard items whose content changed, delete those no longer built
+    (a cuisine with no restaurants left), then mark the boards current for `version`.
+    """
+    written = unchanged = deleted = 0
+    try:
+        restaurants = catalog if catalog is not None else [Restaurant.from_item(it) for it in scan_catalog()]
+        existing = load_board_hashes(cuisine_list | {r.cuisine for r in restaurants})
+        with get_table().batch_writer() as batch:
+            for item in build_leaderboards(restaurants, version):
+                if existing.pop((item["cuisine"], item["business_id"]), None) == item["content_hash"]:
+                    unchanged += 1
+                    continue
+                batch.put_item(Item=item)
+                written += 1
+            for partition, business_id in existing:
+                batch.delete_item(Key={"cuisine": partition, "business_id": business_id})
+                deleted += 1
+        # a newer run may have replaced the catalog version meanwhile; its own boards then follow
+        get_table().update_item(
+            Key=CATALOG_META_KEY,
+            UpdateExpression="SET leaderboards_version = :v",
+            ConditionExpression="version = :v",
+            ExpressionAttributeValues={":v": version},
+        )
+        log("INFO", f"Leaderboards for catalog {version}: {written} written, {unchanged} unchanged, {deleted} deleted")
+    except Exception as e:
+        print(f"[ERROR] Failed to write leaderboards: {e}")
+    return written
+
+
+def iter_parsed_items(businesses, shard=None):
+    """Validate and convert each business on its own; bad records are quarantined, not fatal."""
+    for biz in businesses:
+        try:
+            item = validate_business(biz)
+        except InvalidRecord as e:
+            quarantine.add(biz, str(e), shard)
+            continue
+        except Exception as e:
+            quarantine.add(biz, f"{type(e).__name__}: {e}", shard)
+            continue
+        if log_enabled("DEBUG"):
+            log("DEBUG", f"Parsed item {item}", sampled=True)
+        yield item
 
 
 def validate_and_parse_fetched_data(data):
     """Validate Yelp response JSON and return DynamoDB-ready items."""
+    businesses = json.loads(data).get("businesses")
+    if not isinstance(businesses, list):
+        raise ValueError("Yelp response has no businesses list")
+    log("INFO", f"Parsed {len(businesses)} businesses")
+    return list(iter_parsed_items(businesses))
+
+
+def validate_page(businesses, shard=None):
+    """Validate one page of Yelp businesses and yield DynamoDB-ready items."""
+    yield from iter_parsed_items(businesses, shard)
+
+
+def stream_restaurants(shards, term, counts=None, failed=None, checkpoint=None, should_stop=None):
+    """
+    Yield DynamoDB-ready items page by page as Yelp responses arrive, so only
+    the pages in flight are held in memory and writes overlap fetches. A page is
+    marked finished in the checkpoint once all of its items were handed on.
+    """
+    start_offsets = {shard_key(*shard): checkpoint.start_offset(shard_key(*shard)) for shard in shards} if checkpoint else None
+    pages = iter_shard_pages(shards, term, api_key=YELP_API_KEY, start_offsets=start_offsets,
+                             should_stop=should_stop, failed=failed)
+    for location, category, offset, businesses, total in pages:
+        if counts is not None:
+            counts[shard_key(location, category)] += len(businesses)
+        for item in validate_page(businesses, shard_key(location, category)):
+            # a shard that returned the item (the first one, for items in several); pruning only
+            # touches the shards a run covered. Not hashed, so it is refreshed only with the content
+            item["source_shard"] = shard_key(location, category)
+            yield item
+        if checkpoint is not None:
+            checkpoint.page_finished(shard_key(location, category), offset, len(businesses), total)
+
+
+def plan_shards(locations, categories, shard_index=0, shard_count=1):
+    """Every (location, category) pair, dealt round-robin across `shard_count` workers."""
+    shards = [(location, category) for location in locations for category in sorted(categories)]
+    return shards[shard_index::shard_count]
+
+
+def checkpoint_key(shard_index, shard_count):
+    return {"cuisine": CATALOG_META_KEY["cuisine"], "business_id": f"checkpoint#{shard_index}-of-{shard_count}"}
+
+
+def load_checkpoint(key):
     try:
-        restaurants = RestaurantList.model_validate_json(data)
-        print(f"[INFO] Parsed {len(restaurants.businesses)} businesses")
-
-        items = []
-        for biz in restaurants.businesses:
-            try:
-                item = {
-                    "cuisine": next(
-                        (c.alias for c in biz.categories if c.alias in cuisine_list),
-                        getattr(biz, "queried_cuisine", "other")
-                    ),
-                    "business_id": biz.id,
-                    "name": biz.name,
-                    "review_count": biz.review_count or 0,
-                    "rating": Decimal(str(biz.rating)) if biz.rating is not None else Decimal("0"),
-                    "coordinates": {
-                        "latitude": Decimal(str(biz.coordinates.latitude)),
-                        "longitude": Decimal(str(biz.coordinates.longitude)),
-                    },
-                    "price": biz.price or "N/A",
-                    "location": biz.location.model_dump(),
-                    "zip_code": biz.location.zip_code or "00000",
-                    "business_hours": (
-                        {
-                            "start": biz.business_hours[0].open[0].start,
-                            "end": biz.business_hours[0].open[0].end,
-                        }
-                        if biz.business_hours else {}
-                    ),
-                }
-                print(f"[INFO] Parsed item {item}")
-                items.append(item)
-            except Exception as biz_e:
-                print(f"[ERROR] Failed to parse business {biz.id}: {biz_e}")
-
-        return items
-
-    except ValidationError as e:
-        print("[ERROR] Validation failed")
-        for err in e.errors():
-            print(f"  - {err}")
-        raise
+        if CHECKPOINT_PATH:
+            if not os.path.exists(CHECKPOINT_PATH):
+                return Checkpoint()
+            with open(CHECKPOINT_PATH) as f:
+                return Checkpoint(json.load(f).get(key["business_id"]))
+        item = get_table().get_item(Key=key).get("Item")
+        return Checkpoint(json.loads(item["state"]) if item else None)
+    except Exception as e:
+        log("WARN", f"Could not load checkpoint {key['business_id']}, starting over: {e}")
+        return Checkpoint()
 
-def fetch_restaurants(location, term, categories):
-    url = "https://api.yelp.com/v3/businesses/search"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {YELP_API_KEY}",
+
+def save_checkpoint(key, checkpoint, clear=False):
+    state = None if clear else checkpoint.to_state()
+    try:
+        if CHECKPOINT_PATH:
+            states = {}
+            if os.path.exists(CHECKPOINT_PATH):
+                with open(CHECKPOINT_PATH) as f:
+                    states = json.load(f)
+            if state is None:
+                states.pop(key["business_id"], None)
+            else:
+                states[key["business_id"]] = state
+            with open(CHECKPOINT_PATH, "w") as f:
+                json.dump(states, f)
+        elif state is None:
+            get_table().delete_item(Key=key)
+        else:
+            get_table().put_item(Item={**key, "state": json.dumps(state)})
+    except Exception as e:
+        print(f"[ERROR] Failed to save checkpoint {key['business_id']}: {e}")
+
+
+# bookkeeping fields left out of the hash; source_shard depends on which concurrent page arrived first
+UNHASHED_FIELDS = {"content_hash", "source_shard"}
+
+
+def content_hash(item):
+    payload = json.dumps({k: v for k, v in item.items() if k not in UNHASHED_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def load_existing_hashes():
+    """
+    Scan every restaurant currently in the table into (cuisine, business_id) -> content_hash
+    and (cuisine, business_id) -> source_shard (None for items written before it was kept).
+    """
+    hashes = {}
+    sources = {}
+    kwargs = {
+        "ProjectionExpression": "#c, #id, #h, #s",
+        "ExpressionAttributeNames": {"#c": "cuisine", "#id": "business_id", "#h": "content_hash", "#s": "source_shard"},
     }
+    while True:
+        resp = get_table().scan(**kwargs)
+        for it in resp.get("Items", []):
+            if is_bookkeeping(it):
+                continue
+            hashes[(it["cuisine"], it["business_id"])] = it.get("content_hash")
+            sources[(it["cuisine"], it["business_id"])] = it.get("source_shard")
+        if "LastEvaluatedKey" not in resp:
+            return hashes, sources
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
 
-    all_businesses = []
-    MAX_LIMIT_PER_CATEGORY = 200
-    for category in categories:
-        offset = 0
-        while offset < MAX_LIMIT_PER_CATEGORY:
-        
-            params = {
-                "location": location,
-                "term": term,
-                "categories": category,
-                "sort_by": "best_match",
-                "limit": 50,
-                "offset": offset
-            }
-
-            response = requests.get(url, headers=headers, params=params)
-            data = response.json()
-            businesses = data.get("businesses", [])
-
-            if not businesses:
-                break
 
-            for biz in businesses:
-                biz["queried_cuisine"] = category  
+def open_index_sink(append=False):
+    """BulkIndexer on the configured cluster, or an ActionFile when none is configured."""
+    if OPENSEARCH_URL or AOSS_HOST:
+        if OPENSEARCH_URL:
+            from opensearchpy import OpenSearch
+            search = OpenSearch(hosts=[OPENSEARCH_URL], pool_maxsize=aws_clients.MAX_POOL_CONNECTIONS)
+        else:
+            search = aws_clients.opensearch(AOSS_HOST, AOSS_REGION, "aoss")
+        ensure_index(search, AOSS_INDEX)
+        return BulkIndexer(search, AOSS_INDEX)
+    return ActionFile(SYNC_ACTIONS_PATH, AOSS_INDEX, append=append)
 
-            all_businesses.extend(businesses)
-            offset += len(businesses)
-            if offset >= MAX_LIMIT_PER_CATEGORY:
-                break
+
+def close_index_sink(sink):
+    stats = sink.close()
+    log("INFO", f"Index sync to {OPENSEARCH_URL or AOSS_HOST or SYNC_ACTIONS_PATH}: {stats}")
+    count("DocumentsIndexed", stats.get("index", 0))
+    count("DocumentsIndexFailed", stats.get("failed", 0))
+    return stats
+
+
+def indexed(items, sink):
+    """Pass items through, queueing an index action for each."""
+    for item in items:
+        sink.index(item["business_id"], search_document(item))
+        yield item
+
+
+def changed_items(items, existing, seen):
+    """Stamp each item with its content hash and yield only the new or changed ones."""
+    for item in items:
+        key = (item["cuisine"], item["business_id"])
+        if key in seen:
+            continue
+        seen.add(key)
+        item["content_hash"] = content_hash(item)
+        if existing.get(key) == item["content_hash"]:
+            continue
+        yield item
+
+
+def delete_missing(existing, seen, sources, shards, actions):
+    """
+    Delete restaurants that no longer show up on Yelp. Only restaurants whose source shard
+    is one of `shards` (fully synced in this invocation) are candidates; items without a
+    source shard only when their cuisine was synced for every configured location.
+    Restaurants Yelp still returned but that failed validation this run are kept, since
+    they are in quarantine rather than gone.
+    """
+    quarantined = {rec["business_id"] for rec in quarantine.records if rec["business_id"]}
+    synced = {shard_key(*shard) for shard in shards}
+    covered = {category for _, category in shards
+               if all(shard_key(location, category) in synced for location in LOCATIONS)}
+
+    def prunable(key):
+        source = sources.get(key)
+        return source in synced if source else key[0] in covered
+
+    gone = [key for key in existing if key not in seen and key[1] not in quarantined and prunable(key)]
+    try:
+        with get_table().batch_writer() as batch:
+            for cuisine, business_id in gone:
+                batch.delete_item(Key={"cuisine": cuisine, "business_id": business_id})
+                actions.delete(business_id)
+    except Exception as e:
+        print(f"[ERROR] Batch delete failed: {e}")
+        return 0
+    return len(gone)
+
+
+def sync_incremental(shards, term, counts, failed, checkpoint, should_stop):
+    # only shards read from their first page in this invocation can tell what vanished
+    fresh = [shard for shard in shards if checkpoint.start_offset(shard_key(*shard)) == 0]
+    existing, sources = load_existing_hashes()
+    log("INFO", f"{len(existing)} restaurants currently in {TABLE_NAME}")
+
+    seen = set()
+    deleted = 0
+    # changed items are re-indexed too, since the index carries rating, price and hours
+    actions = open_index_sink(append=bool(checkpoint.shards))
+    try:
+        items = stream_restaurants(shards, term, counts, failed, checkpoint, should_stop)
+        success, written = write_to_dynamo_db(indexed(changed_items(items, existing, seen), actions))
+        # a missing page would look like deleted restaurants, so only prune the shards that
+        # were read end to end, from offset 0, without a failed page
+        failed_shards = {shard_key(location, category) for location, category, _ in failed}
+        clean = [shard for shard in fresh
+                 if checkpoint.is_done(shard_key(*shard)) and shard_key(*shard) not in failed_shards]
+        if success and clean:
+            deleted = delete_missing(existing, seen, sources, clean, actions)
+        if failed:
+            log("WARN", f"Skipping deletes for {len(failed_shards)} shards, {len(failed)} pages failed: {failed}")
+    finally:
+        close_index_sink(actions)
+
+    log("INFO", f"Sync: fetched={len(seen)} written={written} deleted={deleted}")
+    return success, written, deleted
+
+
+def reindex_catalog():
+    """Re-send every restaurant in the table to the index (initial load, mapping changes)."""
+    sink = open_index_sink()
+    try:
+        for item in scan_catalog():
+            sink.index(item["business_id"], search_document(item))
+    finally:
+        stats = close_index_sink(sink)
+    return not stats.get("failed"), stats
+
+
+def fetch_restaurants(location, term, categories):
+    """Fetch one location into a single JSON string (ad-hoc exports; the handler streams instead)."""
+    all_businesses = []
+    for _, _, businesses in iter_pages(location, term, categories, api_key=YELP_API_KEY):
+        all_businesses.extend(businesses)
 
     counts = Counter([biz["queried_cuisine"] for biz in all_businesses])
-    print("[INFO] Counts per cuisine:", counts)
-    print("[INFO] Total businesses:", sum(counts.values()))
+    log("INFO", f"Counts per cuisine: {counts}")
+    log("INFO", f"Total businesses: {sum(counts.values())}")
     return json.dumps({"businesses": all_businesses})
 
 def lambda_handler(event, context):
-    print("[INFO] Lambda triggered")
+    """
+    Optional event keys: "mode", "locations", "categories", "shard_index" and "shard_count".
+    Re-invoking with the same shard settings after a timeout resumes from the checkpoint.
+    Mode "reindex" skips Yelp and bulk-indexes the whole table into OpenSearch.
+    """
+    log("INFO", "Lambda triggered")
+    event = event or {}
+    if event.get("mode") == "reindex":
+        success, stats = reindex_catalog()
+        flush("YelpFetch", mode="reindex")
+        return {"statusCode": 200 if success else 500, "body": json.dumps({"mode": "reindex", **stats})}
 
-    location = "Brooklyn"
     term = "restaurants"
-    categories = list(cuisine_list)
+    locations = event.get("locations") or LOCATIONS
+    categories = event.get("categories") or list(cuisine_list)
+    mode = event.get("mode", SYNC_MODE)
+    shard_index = int(event.get("shard_index", 0))
+    shard_count = int(event.get("shard_count", 1))
+
+    ckpt_key = checkpoint_key(shard_index, shard_count)
+    checkpoint = load_checkpoint(ckpt_key)
+    shards = plan_shards(locations, categories, shard_index, shard_count)
+    todo = [shard for shard in shards if not checkpoint.is_done(shard_key(*shard))]
+    log("INFO", f"Shard {shard_index + 1}/{shard_count}: {len(todo)} of {len(shards)} (location, cuisine) pairs to fetch")
+
+    def should_stop():
+        return context is not None and context.get_remaining_time_in_millis() < DEADLINE_MARGIN_MS
+
+    counts = Counter()
+    failed = []
+    if mode == "incremental":
+        success, written, deleted = sync_incremental(todo, term, counts, failed, checkpoint, should_stop)
+    else:
+        sink = open_index_sink(append=bool(checkpoint.shards))
+        try:
+            items = stream_restaurants(todo, term, counts, failed, checkpoint, should_stop)
+            success, written = write_to_dynamo_db(indexed(items, sink))
+        finally:
+            close_index_sink(sink)
+        deleted = 0
+    log("INFO", f"Counts per shard: {counts}")
+    log("INFO", f"Total businesses: {sum(counts.values())}")
+
+    remaining = [shard_key(*shard) for shard in shards if not checkpoint.is_done(shard_key(*shard))]
+    save_checkpoint(ckpt_key, checkpoint, clear=not remaining)
+    if remaining:
+        log("WARN", f"{len(remaining)} shards unfinished, re-invoke to resume: {remaining}")
 
-    raw_json = fetch_restaurants(location, term, categories)
-    safe_data = validate_and_parse_fetched_data(raw_json)
+    count("ItemsWritten", written)
+    count("ItemsDeleted", deleted)
+    count("PagesFailed", len(failed))
+    count("RecordsQuarantined", quarantine.flush())
+    flush("YelpFetch", mode=mode, shard=f"{shard_index + 1}/{shard_count}")
 
-    if not safe_data:
-        print("[WARN] No valid items parsed")
-        return {"statusCode": 200, "body": "No items written"}
+    if success and (written or deleted):
+        version = write_catalog_version()
+        # one scan serves both the snapshot and the leaderboards
+        catalog = [Restaurant.from_item(it) for it in scan_catalog()] if CATALOG_SNAPSHOT and LEADERBOARDS else None
+        if CATALOG_SNAPSHOT:
+            publish_snapshot(version, catalog)
+        if LEADERBOARDS:
+            publish_leaderboards(version, catalog)
+    elif not written and not deleted:
+        log("WARN", "No items written")
 
-    success = write_to_dynamo_db(safe_data)
     return {
         "statusCode": 200 if success else 500,
-        "body": json.dumps({"inserted": len(safe_data), "success": success}),
+        "body": json.dumps({
+            "mode": mode,
+            "inserted": written,
+            "deleted": deleted,
+            "success": success,
+            "complete": not remaining,
+            "remaining_shards": remaining,
+        }),
     }
@@ -0,0 +1,101 @@
+"""
+Lazily created, container-wide AWS clients shared by the lambdas.
+
+Nothing is built at import: each client is created on first use and then reused by
+every warm invocation of the container. All botocore clients share one tuned Config.
+"""
+import json
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+
+MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "20"))
+CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "2"))
+READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "10"))
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    retries={"max_attempts": 3, "mode": "standard"},
+)
+
+_instances = {}
+_lock = threading.RLock()
+_session = None
+_import_ms = {}
+_init_ms = {}
+_cold = True
+
+
+def _get(key, factory):
+    instance = _instances.get(key)
+    if instance is not None:
+        return instance
+    with _lock:
+        instance = _instances.get(key)
+        if instance is None:
+            started = time.perf_counter()
+            instance = factory()
+            _init_ms[":".join(str(k) for k in key if k)] = round((time.perf_counter() - started) * 1000, 1)
+            _instances[key] = instance
+    return instance
+
+
+def session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def client(service: str, region: str | None = None):
+    return _get(("client", service, region), lambda: session().client(service, region_name=region, config=CLIENT_CONFIG))
+
+
+def resource(service: str, region: str | None = None):
+    return _get(("resource", service, region), lambda: session().resource(service, region_name=region, config=CLIENT_CONFIG))
+
+
+def table(name: str, region: str | None = None):
+    return _get(("table", name, region), lambda: resource("dynamodb", region).Table(name))
+
+
+def opensearch(host: str, region: str, service: str = "aoss"):
+    """SigV4-signed OpenSearch client; opensearch-py is only imported when first needed."""
+
+    def factory():
+        from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
+
+        auth = AWSV4SignerAuth(session().get_credentials(), region, service)
+        return OpenSearch(
+            hosts=[{"host": host, "port": 443}],
+            http_auth=auth,
+            use_ssl=True,
+            verify_certs=True,
+            connection_class=RequestsHttpConnection,
+            pool_maxsize=MAX_POOL_CONNECTIONS,
+            timeout=READ_TIMEOUT,
+        )
+
+    return _get(("opensearch", host, region), factory)
+
+
+def record_import(name: str, started: float):
+    """Call at the end of a lambda's module-level setup with a perf_counter() taken before its imports."""
+    _import_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def report_cold_start() -> dict | None:
+    """Log import and client-creation times once, on the first invocation of a container."""
+    global _cold
+    if not _cold:
+        return None
+    _cold = False
+    report = {"cold_start": True, "imports_ms": dict(_import_ms), "clients_ms": dict(_init_ms)}
+    print(f"[INFO] {json.dumps(report)}")
+    return report
@@ -0,0 +1,173 @@
+"""
+Compact, in-process copy of the restaurant catalog for LF2's embedded mode.
+
+YelpFetch writes a snapshot after every ingestion run that changed the catalog:
+gzip-compressed JSON with one column per field instead of one object per restaurant,
+stamped with the catalog version it was built from. LF2 loads it once per container
+and answers cuisine + rating + open-at-time + location queries from in-memory indexes,
+falling back to OpenSearch + DynamoDB when the snapshot does not match the current version.
+
+A snapshot location is either a local path or an `s3://bucket/key` URL.
+"""
+import gzip
+import json
+import random
+
+import aws_clients
+from geo import GEO_MAX_RADIUS_KM, GEO_RADIUS_KM, GridIndex, zip_centroids
+from opening_hours import OpeningHoursIndex, minute_of_week
+from ranking import Columns
+from restaurant_record import Restaurant
+
+SNAPSHOT_FORMAT = 1
+COLUMNS = (
+    "business_id", "name", "cuisine", "rating", "review_count", "price",
+    "zip_code", "latitude", "longitude", "open_intervals", "display",
+)
+
+
+def to_columns(items) -> dict[str, list]:
+    """One list per field of COLUMNS for restaurants (plain items or Restaurant records)."""
+    columns = {name: [] for name in COLUMNS}
+    for item in items:
+        r = item if isinstance(item, Restaurant) else Restaurant.from_item(item)
+        for name in COLUMNS:
+            value = getattr(r, name)
+            columns[name].append([v for iv in value for v in iv] if name == "open_intervals" else value)
+    return columns
+
+
+def from_columns(columns: dict[str, list]) -> list[Restaurant]:
+    restaurants = []
+    for row in zip(*(columns[name] for name in COLUMNS)):
+        fields = dict(zip(COLUMNS, row))
+        flat = fields["open_intervals"]
+        fields["open_intervals"] = tuple(zip(flat[::2], flat[1::2]))
+        restaurants.append(Restaurant(**fields))
+    return restaurants
+
+
+def build_snapshot(items, version: str, built_at: str | None = None) -> bytes:
+    """Serialize restaurants (plain items or Restaurant records) into snapshot bytes."""
+    doc = {"format": SNAPSHOT_FORMAT, "version": version, "built_at": built_at, "columns": to_columns(items)}
+    return gzip.compress(json.dumps(doc, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def write_snapshot(data: bytes, location: str):
+    if location.startswith("s3://"):
+        bucket, key = _split_s3(location)
+        aws_clients.client("s3").put_object(Bucket=bucket, Key=key, Body=data, ContentType="application/gzip")
+    else:
+        with open(location, "wb") as f:
+            f.write(data)
+
+
+def read_snapshot(location: str) -> bytes:
+    if location.startswith("s3://"):
+        bucket, key = _split_s3(location)
+        return aws_clients.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()
+    with open(location, "rb") as f:
+        return f.read()
+
+
+def load_snapshot(location: str) -> "CatalogSnapshot":
+    return CatalogSnapshot.from_bytes(read_snapshot(location))
+
+
+def _split_s3(location: str) -> tuple[str, str]:
+    bucket, _, key = location[len("s3://"):].partition("/")
+    return bucket, key
+
+
+class CatalogSnapshot:
+    """
+    Restaurants grouped by cuisine, sorted by rating, with one opening-hours index, one
+    lat/long grid and one set of ranking columns per cuisine, plus zip code centroids
+    for resolving locations.
+    """
+
+    def __init__(self, restaurants, version: str | None = None, built_at: str | None = None):
+        self.version = version
+        self.built_at = built_at
+        self.by_cuisine = {}
+        for r in restaurants:
+            self.by_cuisine.setdefault(r.cuisine, []).append(r)
+        for items in self.by_cuisine.values():
+            items.sort(key=lambda r: r.rating, reverse=True)
+        self.hours = {cuisine: OpeningHoursIndex(items) for cuisine, items in self.by_cuisine.items()}
+        self.grids = {cuisine: GridIndex(items) for cuisine, items in self.by_cuisine.items()}
+        self.columns = {cuisine: Columns(items) for cuisine, items in self.by_cuisine.items()}
+        self.zip_centroids = zip_centroids(r for items in self.by_cuisine.values() for r in items)
+        self._shuffles = {}  # (cuisine, seed) -> restaurants in seeded random order
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CatalogSnapshot":
+        doc = json.loads(gzip.decompress(data))
+        if doc.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {doc.get('format')}")
+        return cls(from_columns(doc["columns"]), doc.get("version"), doc.get("built_at"))
+
+    def __len__(self):
+        return sum(len(items) for items in self.by_cuisine.values())
+
+    def query(self, cuisine: str, limit: int, dining_time: str | None = None, day: int = 0,
+              seed: int | None = None, fetch_size: int | None = None, max_candidates: int | None = None,
+              origin: tuple[float, float] | None = None, weights: dict | None = None) -> list[Restaurant]:
+        """
+        Top `limit` restaurants for a cuisine, open at `dining_time` on `day` if given.
+
+        Without a seed every open restaurant is a candidate. With a seed candidates
+        are a random sample, as on the remote path: they come from a seeded shuffle in
+        doubling batches of `fetch_size` until enough are open. With an `origin`,
+        candidates are limited to a radius around it (doubled until enough are open).
+        Candidates are ranked with `weights` (default RANK_WEIGHTS).
+        """
+        items = self.by_cuisine.get(cuisine, [])
+        if not items:
+            return []
+        open_ids = self.hours[cuisine].open_at(minute_of_week(day, dining_time)) if dining_time else None
+        nearby = self._nearby(cuisine, origin, limit, open_ids) if origin is not None else None
+
+        def is_open(r):
+            return (open_ids is None or r.business_id in open_ids) and (nearby is None or r.business_id in nearby)
+
+        columns = self.columns.get(cuisine)
+        kwargs = {"weights": weights} if weights else {}
+        if seed is None:
+            if open_ids is None and nearby is None:
+                return columns.top_k(limit, origin, **kwargs)
+            return columns.top_k(limit, origin, idx=[i for i, r in enumerate(items) if is_open(r)], **kwargs)
+
+        order = self._shuffled(cuisine, seed)
+        # the candidate cap mirrors the remote path; a radius already bounds the candidates
+        cap = len(order) if max_candidates is None or nearby is not None else min(len(order), max_candidates)
+        size = fetch_size or max(limit, 1)
+        end = 0
+        matches = []
+        while True:
+            start, end = end, min(end + size, cap)
+            matches.extend(r for r in order[start:end] if is_open(r))
+            if len(matches) >= limit or end >= cap:
+                break
+            size *= 2
+        return columns.top_k(limit, origin, idx=[columns.pos[r.business_id] for r in matches], **kwargs)
+
+    def _nearby(self, cuisine: str, origin: tuple[float, float], limit: int, open_ids) -> frozenset | None:
+        """Ids within the smallest radius holding `limit` open restaurants; None (no limit) if even the largest does not."""
+        radius = GEO_RADIUS_KM
+        while True:
+            nearby = self.grids[cuisine].near(origin[0], origin[1], radius)
+            if sum(1 for rid in nearby if open_ids is None or rid in open_ids) >= limit:
+                return nearby
+            if radius >= GEO_MAX_RADIUS_KM:
+                return None
+            radius = min(radius * 2, GEO_MAX_RADIUS_KM)
+
+    def _shuffled(self, cuisine: str, seed: int) -> list[Restaurant]:
+        key = (cuisine, seed)
+        order = self._shuffles.get(key)
+        if order is None:
+            order = list(self.by_cuisine.get(cuisine, []))
+            random.Random(f"{cuisine}:{seed}").shuffle(order)
+            self._shuffles[key] = order
+        return order
@@ -0,0 +1,164 @@
+"""
+Location resolution and spatial indexing for LF2's location-aware ranking.
+
+The requested Location is resolved against a small built-in gazetteer of NYC
+neighborhoods, or a 5-digit zip code against zip centroids computed from the catalog.
+Boroughs are in the gazetteer for slot canonicalization but, like "New York", are too
+broad to rank by distance from one point, so they resolve to no origin. Restaurants are bucketed into a lat/long grid so "near X" touches only the
+cells around X; `ranking` then scores the candidates by distance among other factors.
+"""
+import math
+import os
+import re
+
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_DEGREES = float(os.getenv("GEO_GRID_CELL_DEGREES", "0.01"))  # ~1.1 km of latitude
+GEO_RADIUS_KM = float(os.getenv("GEO_RADIUS_KM", "3"))
+GEO_MAX_RADIUS_KM = float(os.getenv("GEO_MAX_RADIUS_KM", "25"))
+
+GAZETTEER = {
+    # boroughs
+    "manhattan": (40.7831, -73.9712),
+    "brooklyn": (40.6782, -73.9442),
+    "queens": (40.7282, -73.7949),
+    "bronx": (40.8448, -73.8648),
+    "the bronx": (40.8448, -73.8648),
+    "staten island": (40.5795, -74.1502),
+    # Brooklyn
+    "williamsburg": (40.7081, -73.9571),
+    "greenpoint": (40.7304, -73.9515),
+    "bushwick": (40.6944, -73.9213),
+    "dumbo": (40.7033, -73.9881),
+    "downtown brooklyn": (40.6928, -73.9903),
+    "brooklyn heights": (40.6960, -73.9937),
+    "cobble hill": (40.6860, -73.9969),
+    "carroll gardens": (40.6795, -73.9991),
+    "fort greene": (40.6892, -73.9742),
+    "prospect heights": (40.6775, -73.9692),
+    "park slope": (40.6710, -73.9814),
+    "bed-stuy": (40.6872, -73.9418),
+    "bed stuy": (40.6872, -73.9418),
+    "bedford-stuyvesant": (40.6872, -73.9418),
+    "crown heights": (40.6694, -73.9422),
+    "flatbush": (40.6409, -73.9624),
+    "sunset park": (40.6455, -74.0124),
+    "bay ridge": (40.6264, -74.0299),
+    "bensonhurst": (40.6048, -73.9966),
+    "coney island": (40.5755, -73.9707),
+    # Manhattan
+    "financial district": (40.7075, -74.0113),
+    "fidi": (40.7075, -74.0113),
+    "tribeca": (40.7163, -74.0086),
+    "chinatown": (40.7158, -73.9970),
+    "lower east side": (40.7150, -73.9843),
+    "soho": (40.7233, -74.0030),
+    "east village": (40.7265, -73.9815),
+    "west village": (40.7358, -74.0036),
+    "greenwich village": (40.7336, -74.0027),
+    "flatiron": (40.7411, -73.9897),
+    "chelsea": (40.7465, -74.0014),
+    "murray hill": (40.7479, -73.9757),
+    "midtown": (40.7549, -73.9840),
+    "times square": (40.7580, -73.9855),
+    "hell's kitchen": (40.7638, -73.9918),
+    "hells kitchen": (40.7638, -73.9918),
+    "upper west side": (40.7870, -73.9754),
+    "upper east side": (40.7736, -73.9566),
+    "harlem": (40.8116, -73.9465),
+    # Queens
+    "astoria": (40.7644, -73.9235),
+    "long island city": (40.7447, -73.9485),
+    "jackson heights": (40.7557, -73.8831),
+    "flushing": (40.7675, -73.8331),
+}
+# whole areas: their centroid is not a useful origin, so they resolve like "New York"
+AREAS = {"manhattan", "brooklyn", "queens", "bronx", "the bronx", "staten island"}
+# longest names first, so "downtown brooklyn" wins over "brooklyn"
+_GAZETTEER_PATTERNS = [(name, re.compile(rf"\b{re.escape(name)}\b")) for name in sorted(GAZETTEER, key=len, reverse=True)]
+_ZIP_RE = re.compile(r"\b(\d{5})\b")
+
+
+def resolve_location(text: str | None, zip_centroids: dict | None = None) -> tuple[float, float] | None:
+    """(lat, lon) for a free-text location, or None when it is unknown or too broad (e.g. "New York", "Brooklyn")."""
+    if not text:
+        return None
+    s = " ".join(str(text).lower().split())
+    m = _ZIP_RE.search(s)
+    if m and zip_centroids and m.group(1) in zip_centroids:
+        return zip_centroids[m.group(1)]
+    name = _gazetteer_name(s)
+    return GAZETTEER[name] if name and name not in AREAS else None
+
+
+def gazetteer_name(text: str | None) -> str | None:
+    """The gazetteer entry mentioned in a free-text location ("dinner in park slope" -> "park slope")."""
+    return _gazetteer_name(" ".join(str(text).lower().split())) if text else None
+
+
+def _gazetteer_name(s: str) -> str | None:
+    if s in GAZETTEER:
+        return s
+    for name, pattern in _GAZETTEER_PATTERNS:
+        if pattern.search(s):
+            return name
+    return None
+
+
+def zip_centroids(restaurants) -> dict[str, tuple[float, float]]:
+    """Mean coordinates of the restaurants in each zip code."""
+    sums = {}
+    for r in restaurants:
+        if r.latitude is None or r.longitude is None or not r.zip_code:
+            continue
+        lat, lon, n = sums.get(r.zip_code, (0.0, 0.0, 0))
+        sums[r.zip_code] = (lat + r.latitude, lon + r.longitude, n + 1)
+    return {z: (lat / n, lon / n) for z, (lat, lon, n) in sums.items()}
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    Restaurant ids bucketed by (lat, lon) grid cell; `near` scans only the cells around
+    a point. Origins come from a small gazetteer, so results are memoized per query.
+    """
+
+    MAX_MEMO = 256
+
+    def __init__(self, restaurants, cell: float = GRID_CELL_DEGREES):
+        self.cell = cell
+        self.cells = {}
+        self._memo = {}
+        for r in restaurants:
+            if r.latitude is not None and r.longitude is not None:
+                self.cells.setdefault(self._cell(r.latitude, r.longitude), []).append(r)
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def near(self, lat: float, lon: float, radius_km: float) -> frozenset:
+        """Ids of the restaurants within `radius_km` of (lat, lon)."""
+        key = (lat, lon, radius_km)
+        ids = self._memo.get(key)
+        if ids is None:
+            if len(self._memo) >= self.MAX_MEMO:
+                self._memo.clear()
+            ids = self._memo[key] = self._scan(lat, lon, radius_km)
+        return ids
+
+    def _scan(self, lat: float, lon: float, radius_km: float) -> frozenset:
+        dlat = radius_km / 111.0
+        dlon = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        (lat0, lon0), (lat1, lon1) = self._cell(lat - dlat, lon - dlon), self._cell(lat + dlat, lon + dlon)
+        ids = set()
+        for i in range(lat0, lat1 + 1):
+            for j in range(lon0, lon1 + 1):
+                for r in self.cells.get((i, j), ()):
+                    if haversine_km(lat, lon, r.latitude, r.longitude) <= radius_km:
+                        ids.add(r.business_id)
+        return frozenset(ids)
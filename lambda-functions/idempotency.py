@@ -0,0 +1,118 @@
+"""
+Idempotency records for LF2's SQS messages.
+
+SQS delivers at least once, so LF2 can see a message again after a timeout, a partial
+batch failure or a redrive. Each message is claimed under its message id plus a hash of
+its body before it is processed, and the stages it completes are recorded: a redelivered
+message that already finished is skipped, and a retry resumes after the last completed
+stage (e.g. re-sends the email with the restaurants found the first time).
+
+`DynamoIdempotencyStore` uses conditional writes on a table with partition key
+`idempotency_key` (string) and TTL on `expires_at`; `MemoryIdempotencyStore` is the
+in-process stand-in with the same semantics.
+"""
+import hashlib
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+STAGE_LOOKED_UP = "looked_up"  # restaurant_ids recorded
+STAGE_STORED = "stored"  # results written for the chat
+STAGE_EMAILED = "emailed"
+STAGE_DONE = "done"
+
+
+class AlreadyInProgress(Exception):
+    """Another invocation holds the message's lease."""
+
+
+def idempotency_key(message_id: str, body: str | None) -> str:
+    digest = hashlib.sha256((body or "").encode("utf-8")).hexdigest()[:16]
+    return f"{message_id}#{digest}"
+
+
+class MemoryIdempotencyStore:
+    def __init__(self, lease_seconds: int, ttl_seconds: int):
+        self.lease_seconds = lease_seconds
+        self.ttl_seconds = ttl_seconds
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def start(self, key: str) -> dict:
+        """Claim `key` for `lease_seconds`; returns the stages completed so far. Raises AlreadyInProgress."""
+        now = int(time.time())
+        with self._lock:
+            rec = self.records.get(key)
+            if rec is not None and rec["expires_at"] <= now:
+                rec = None
+            if rec is not None and rec["lease_until"] >= now and STAGE_DONE not in rec["stages"]:
+                raise AlreadyInProgress(key)
+            if rec is None:
+                rec = self.records[key] = {"stages": set(), "restaurant_ids": [], "expires_at": now + self.ttl_seconds}
+            rec["lease_until"] = now + self.lease_seconds
+            return {"stages": set(rec["stages"]), "restaurant_ids": list(rec["restaurant_ids"])}
+
+    def record(self, key: str, stages, release: bool = False, **fields):
+        """Add completed `stages` (and fields such as restaurant_ids); `release` gives up the lease."""
+        with self._lock:
+            rec = self.records.get(key)
+            if rec is None:
+                return
+            rec["stages"].update(stages)
+            rec.update(fields)
+            if release:
+                rec["lease_until"] = 0
+
+
+class DynamoIdempotencyStore:
+    def __init__(self, table_name: str, lease_seconds: int, ttl_seconds: int):
+        self.table_name = table_name
+        self.lease_seconds = lease_seconds
+        self.ttl_seconds = ttl_seconds
+
+    def start(self, key: str) -> dict:
+        """Claim `key` for `lease_seconds`; returns the stages completed so far. Raises AlreadyInProgress."""
+        now = int(time.time())
+        try:
+            item = aws_clients.table(self.table_name).update_item(
+                Key={"idempotency_key": key},
+                UpdateExpression="SET lease_until = :lease, expires_at = if_not_exists(expires_at, :expires)",
+                # a finished message is always readable; an unfinished one only after its lease ran out
+                ConditionExpression="attribute_not_exists(idempotency_key) OR lease_until < :now OR contains(stages, :done)",
+                ExpressionAttributeValues={
+                    ":lease": now + self.lease_seconds,
+                    ":expires": now + self.ttl_seconds,
+                    ":now": now,
+                    ":done": STAGE_DONE,
+                },
+                ReturnValues="ALL_NEW",
+            )["Attributes"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise AlreadyInProgress(key) from e
+            raise
+        return {"stages": set(item.get("stages") or ()), "restaurant_ids": list(item.get("restaurant_ids") or [])}
+
+    def record(self, key: str, stages, release: bool = False, **fields):
+        """Add completed `stages` (and fields such as restaurant_ids); `release` gives up the lease."""
+        sets = [f"#{name} = :{name}" for name in fields]
+        values = {f":{name}": value for name, value in fields.items()}
+        if release:
+            sets.append("lease_until = :zero")
+            values[":zero"] = 0
+        expression = "SET " + ", ".join(sets) if sets else ""
+        if stages:
+            expression += " ADD stages :stages"
+            values[":stages"] = set(stages)
+        if not expression:
+            return
+        kwargs = {"ExpressionAttributeNames": {f"#{name}": name for name in fields}} if fields else {}
+        aws_clients.table(self.table_name).update_item(
+            Key={"idempotency_key": key},
+            UpdateExpression=expression.strip(),
+            ExpressionAttributeValues=values,
+            **kwargs,
+        )
@@ -0,0 +1,90 @@
+"""
+Lightweight instrumentation shared by the lambdas.
+
+`span()` times external calls, `count()` records counters, and `flush()` prints
+everything recorded during the invocation as one CloudWatch Embedded Metric Format
+line. `log()` is level-gated by LOG_LEVEL and can be sampled for per-item messages.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# fraction of sampled (per-item) log lines that are actually printed
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "DiningConcierge")
+EMF_MAX_VALUES = 100  # per metric per EMF document
+
+_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+_threshold = _LEVELS.get(LOG_LEVEL, 20)
+
+
+def log_enabled(level: str) -> bool:
+    return _LEVELS[level] >= _threshold
+
+
+def log(level: str, msg: str, sampled: bool = False):
+    if _LEVELS[level] < _threshold:
+        return
+    if sampled and random.random() >= LOG_SAMPLE_RATE:
+        return
+    print(f"[{level}] {msg}")
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(list)
+        self._units = {}
+
+    def record(self, name: str, value: float, unit: str = "Milliseconds"):
+        with self._lock:
+            self._values[name].append(value)
+            self._units[name] = unit
+
+    def count(self, name: str, n: int = 1):
+        self.record(name, n, "Count")
+
+    @contextmanager
+    def span(self, name: str):
+        """Record the block's wall time as `<name>Latency`, even when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(f"{name}Latency", round((time.perf_counter() - started) * 1000, 3))
+
+    def flush(self, function: str, **properties) -> dict | None:
+        """Print and reset the metrics recorded since the last flush as one EMF document."""
+        with self._lock:
+            values, units = self._values, self._units
+            self._values, self._units = defaultdict(list), {}
+        if not values:
+            return None
+
+        doc = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Function"]],
+                    "Metrics": [{"Name": name, "Unit": units[name]} for name in values],
+                }],
+            },
+            "Function": function,
+            **properties,
+        }
+        for name, vals in values.items():
+            doc[name] = vals[0] if len(vals) == 1 else vals[:EMF_MAX_VALUES]
+        print(json.dumps(doc, default=str))
+        return doc
+
+
+metrics = Metrics()
+span = metrics.span
+count = metrics.count
+flush = metrics.flush
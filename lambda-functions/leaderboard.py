@@ -0,0 +1,85 @@
+"""
+Materialized per-cuisine leaderboards for LF2.
+
+After an ingestion run that changed the catalog, YelpFetch writes the best
+LEADERBOARD_SIZE restaurants of each cuisine (by RANK_WEIGHTS, without distance) into
+the restaurants table, each cuisine under its own "__leaderboard__#<cuisine>" partition,
+which catalog scans skip. With LEADERBOARD_HOURS there is also one item per (cuisine,
+hour of the week) holding the best restaurants open at some point in that hour. The
+restaurants are stored as the snapshot's column lists in one JSON string, so LF2 reads
+one fixed-size item whatever the size of the catalog.
+
+Each board carries a hash of its content, and only boards whose hash changed are
+rewritten. Boards therefore do not carry the catalog version; once all of them are
+current, YelpFetch stamps the catalog version item with `leaderboards_version`, and
+LF2 only reads boards while that matches the catalog version.
+"""
+import hashlib
+import json
+import os
+
+from catalog_snapshot import from_columns, to_columns
+from opening_hours import MINUTES_PER_WEEK
+from ranking import Columns
+
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "50"))
+LEADERBOARD_HOURS = os.getenv("LEADERBOARD_HOURS", "true").lower() == "true"
+HOURS_PER_WEEK = MINUTES_PER_WEEK // 60
+# one partition per cuisine, apart from the "__meta__" version and checkpoint items
+PARTITION_PREFIX = "__leaderboard__#"
+
+
+def leaderboard_key(cuisine: str, hour: int | None = None) -> dict:
+    """Key of a cuisine's leaderboard, or of its board for one hour of the week (0 = Monday 00:00)."""
+    return {"cuisine": leaderboard_partition(cuisine), "business_id": "all" if hour is None else f"hour#{hour}"}
+
+
+def leaderboard_partition(cuisine: str) -> str:
+    return PARTITION_PREFIX + cuisine
+
+
+def open_hours(intervals) -> set[int]:
+    """Hours of the week that overlap any of the [start, end) minute-of-week intervals."""
+    hours = set()
+    for lo, hi in intervals:
+        if hi > lo:
+            hours.update(range(lo // 60, (hi - 1) // 60 + 1))
+    return hours
+
+
+def build_leaderboards(restaurants, version: str, size: int = LEADERBOARD_SIZE, hours: bool = LEADERBOARD_HOURS):
+    """Yield the leaderboard items for Restaurant records, stamped with the catalog `version` they were built for."""
+    by_cuisine = {}
+    for r in restaurants:
+        by_cuisine.setdefault(r.cuisine, []).append(r)
+
+    for cuisine, items in by_cuisine.items():
+        columns = Columns(items)
+        yield _board(leaderboard_key(cuisine), columns.top_k(size), version, size)
+        if not hours:
+            continue
+        buckets = [[] for _ in range(HOURS_PER_WEEK)]
+        for i, r in enumerate(items):
+            for hour in open_hours(r.open_intervals):
+                buckets[hour].append(i)
+        for hour, idx in enumerate(buckets):
+            # written even when empty, so LF2 can tell "nothing open" from "no board"
+            yield _board(leaderboard_key(cuisine, hour), columns.top_k(size, idx=idx), version, size)
+
+
+def _board(key: dict, top: list, version: str, size: int) -> dict:
+    # fewer than `size` means the board holds every candidate, so LF2 need not fall back
+    complete = len(top) < size
+    restaurants = json.dumps(to_columns(top), separators=(",", ":"), default=str)
+    return {
+        **key,
+        "version": version,
+        "complete": complete,
+        "restaurants": restaurants,
+        "content_hash": hashlib.sha256(f"{complete}|{restaurants}".encode("utf-8")).hexdigest(),
+    }
+
+
+def read_board(item: dict) -> list:
+    """Restaurant records of a leaderboard item, best first."""
+    return from_columns(json.loads(item["restaurants"]))
@@ -0,0 +1,153 @@
+from array import array
+from bisect import bisect_right
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# OpeningHoursIndex keeps a copy of the open set at least this many events apart
+CHECKPOINT_MIN_EVENTS = 256
+
+
+_minutes = {}  # parsed strings; a catalog only uses a few hundred distinct times
+
+
+def hhmm_to_minutes(hhmm) -> int:
+    """'0730' or '07:30' -> 450."""
+    if isinstance(hhmm, str):
+        minutes = _minutes.get(hhmm)
+        if minutes is None:
+            minutes = _minutes[hhmm] = _parse_hhmm(hhmm)
+        return minutes
+    if isinstance(hhmm, dict) and "S" in hhmm:  # export-style {"S":"0730"}
+        hhmm = hhmm["S"]
+    return _parse_hhmm(hhmm)
+
+
+def _parse_hhmm(hhmm) -> int:
+    s = str(hhmm).strip()
+    if ":" in s:
+        h, m = s.split(":")
+    else:
+        h, m = s[:2], s[2:]
+    return int(h) * 60 + int(m)
+
+
+def minute_of_week(day: int, hhmm) -> int:
+    """Yelp numbers days from 0 = Monday, same as datetime.weekday()."""
+    return day * MINUTES_PER_DAY + hhmm_to_minutes(hhmm)
+
+
+def weekly_intervals(windows) -> list[list[int]]:
+    """
+    Convert Yelp `open` windows ({"day", "start", "end"}) into sorted, half-open
+    [start, end) minute-of-week intervals. Overnight windows run into the next day
+    and wrap around Sunday night; start == end means open all day.
+    """
+    intervals = []
+    for w in windows or []:
+        try:
+            day = int(w.get("day", 0))
+            start = hhmm_to_minutes(w["start"])
+            end = hhmm_to_minutes(w["end"])
+        except (KeyError, TypeError, ValueError):
+            continue
+
+        if start == end:
+            end = start + MINUTES_PER_DAY
+        elif end < start:
+            end += MINUTES_PER_DAY
+        lo = day * MINUTES_PER_DAY + start
+        hi = day * MINUTES_PER_DAY + end
+        if hi > MINUTES_PER_WEEK:
+            intervals.append([lo, MINUTES_PER_WEEK])
+            intervals.append([0, hi - MINUTES_PER_WEEK])
+        else:
+            intervals.append([lo, hi])
+    return sorted(intervals)
+
+
+def daily_windows_to_intervals(hours) -> list[list[int]]:
+    """Items written before weekly hours were kept only have one daily window; assume it every day."""
+    if isinstance(hours, dict) and "start" in hours and "end" in hours:
+        hours = [hours]
+    if not isinstance(hours, (list, tuple)):
+        return []
+    windows = [
+        {"day": day, "start": w.get("start"), "end": w.get("end")}
+        for w in hours if isinstance(w, dict)
+        for day in range(7)
+    ]
+    return weekly_intervals(windows)
+
+
+def item_intervals(item: dict) -> list[list[int]]:
+    intervals = item.get("open_intervals")
+    if intervals is not None:
+        return [[int(lo), int(hi)] for lo, hi in intervals]
+    return daily_windows_to_intervals(item.get("business_hours"))
+
+
+class OpeningHoursIndex:
+    """
+    Minute-of-week open/close events of a set of restaurants, sorted by time, with the
+    set of open ids checkpointed every `len(restaurants)` events. `open_at` bisects to
+    the minute, copies the nearest checkpoint before it and replays the events since,
+    so memory stays linear in the number of restaurants and intervals.
+    """
+
+    def __init__(self, items):
+        by_id = {}
+        for item in items:
+            if isinstance(item, dict):
+                rid, intervals = item.get("business_id"), item_intervals(item)
+            else:  # Restaurant records carry their intervals already converted
+                rid, intervals = item.business_id, item.open_intervals
+            by_id.setdefault(rid, []).extend(intervals)
+
+        # merged intervals never overlap, so each event opens or closes one restaurant outright
+        times, opens, ids = [], [], []
+        for rid, intervals in by_id.items():
+            for lo, hi in _merged(intervals):
+                times += (lo, hi)
+                opens += (True, False)
+                ids += (rid, rid)
+        order = sorted(range(len(times)), key=times.__getitem__)
+        self.times = array("i", [times[i] for i in order])
+        self.opens = [opens[i] for i in order]
+        self.ids = [ids[i] for i in order]
+        self.step = max(CHECKPOINT_MIN_EVENTS, len(by_id))
+        self.checkpoints = []
+        open_ids = set()
+        for start in range(0, len(order) + 1, self.step):
+            self.checkpoints.append(frozenset(open_ids))
+            self._replay(open_ids, start, min(start + self.step, len(order)))
+
+    def open_at(self, minute: int) -> set:
+        end = bisect_right(self.times, minute % MINUTES_PER_WEEK)
+        start = end // self.step * self.step
+        open_ids = set(self.checkpoints[end // self.step])
+        self._replay(open_ids, start, end)
+        return open_ids
+
+    def _replay(self, open_ids: set, start: int, end: int):
+        ids, opens = self.ids, self.opens
+        for i in range(start, end):
+            if opens[i]:
+                open_ids.add(ids[i])
+            else:
+                open_ids.discard(ids[i])
+
+    def approx_size(self) -> int:
+        return 20 * len(self.times) + sum(8 * len(s) + 64 for s in self.checkpoints)
+
+
+def _merged(intervals) -> list[tuple[int, int]]:
+    """Sorted, non-overlapping intervals, so the one starting last before a minute is the only candidate."""
+    merged = []
+    for lo, hi in sorted(intervals):
+        if hi <= lo:
+            continue
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
@@ -0,0 +1,184 @@
+"""
+Streaming OpenSearch `_bulk` indexing for YelpFetch.
+
+Index and delete actions are buffered into chunks bounded by document count and
+bytes, and each chunk is sent by one of several worker threads, each on its own
+pooled connection. Documents the cluster rejects with a retryable status
+(429 / 5xx) are re-sent on their own, with backoff. `ActionFile` writes the same
+actions as NDJSON for offline runs, and has the same interface.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import log, span
+
+BULK_CHUNK_DOCS = int(os.getenv("BULK_CHUNK_DOCS", "1000"))
+BULK_CHUNK_BYTES = int(os.getenv("BULK_CHUNK_BYTES", str(5 * 1024 * 1024)))
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "4"))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "5"))
+BULK_BACKOFF_SECONDS = float(os.getenv("BULK_BACKOFF_SECONDS", "0.2"))  # doubled per retry, capped at 10s
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# cuisine and restaurant_id keep the text + .keyword shape LF2 queries; the rest are ranking fields
+INDEX_MAPPINGS = {
+    "properties": {
+        "cuisine": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+        "restaurant_id": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+        "rating": {"type": "float"},
+        "review_count": {"type": "integer"},
+        "price": {"type": "keyword"},
+        "open_intervals": {"type": "integer_range"},
+        "location": {"type": "geo_point"},
+    }
+}
+
+
+def search_document(item: dict) -> dict:
+    """The indexed fields of a DynamoDB restaurant item: ids plus the fields ranking needs."""
+    coords = item.get("coordinates") or {}
+    doc = {
+        "restaurant_id": item["business_id"],
+        "cuisine": item["cuisine"],
+        "rating": float(item.get("rating") or 0),
+        "review_count": int(item.get("review_count") or 0),
+        "price": item.get("price") or "N/A",
+        # minute-of-week [start, end) windows, so "open at T" is a range term query
+        "open_intervals": [{"gte": int(lo), "lt": int(hi)} for lo, hi in item.get("open_intervals") or []],
+    }
+    if coords.get("latitude") is not None and coords.get("longitude") is not None:
+        doc["location"] = {"lat": float(coords["latitude"]), "lon": float(coords["longitude"])}
+    return doc
+
+
+def ensure_index(client, index: str):
+    """Create the index with INDEX_MAPPINGS unless it already exists."""
+    if not client.indices.exists(index=index):
+        client.indices.create(index=index, body={"mappings": INDEX_MAPPINGS})
+        log("INFO", f"Created OpenSearch index {index}")
+
+
+class BulkIndexer:
+    """Chunked, parallel `_bulk` sender with per-document retries. Call `close()` to flush and wait."""
+
+    def __init__(self, client, index: str, *, chunk_docs: int = BULK_CHUNK_DOCS, chunk_bytes: int = BULK_CHUNK_BYTES,
+                 workers: int = BULK_WORKERS, max_retries: int = BULK_MAX_RETRIES,
+                 backoff: float = BULK_BACKOFF_SECONDS):
+        self.client = client
+        self.index_name = index
+        self.chunk_docs = chunk_docs
+        self.chunk_bytes = chunk_bytes
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = Counter()
+        self.errors = []  # (doc id, reason) of documents that were given up on
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        # at most two chunks queued per worker, so a fast producer cannot buffer the whole catalog
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._futures = []
+        self._chunk = []
+        self._chunk_size = 0
+
+    def index(self, doc_id: str, doc: dict):
+        action = json.dumps({"index": {"_index": self.index_name, "_id": doc_id}})
+        self._add(doc_id, action + "\n" + json.dumps(doc, default=str) + "\n")
+
+    def delete(self, doc_id: str):
+        self._add(doc_id, json.dumps({"delete": {"_index": self.index_name, "_id": doc_id}}) + "\n")
+
+    def close(self) -> dict:
+        if self._chunk:
+            self._submit()
+        for future in self._futures:
+            future.result()
+        self._pool.shutdown()
+        return dict(self.stats)
+
+    def _add(self, doc_id: str, lines: str):
+        self._chunk.append((doc_id, lines))
+        self._chunk_size += len(lines)
+        if len(self._chunk) >= self.chunk_docs or self._chunk_size >= self.chunk_bytes:
+            self._submit()
+
+    def _submit(self):
+        chunk, self._chunk, self._chunk_size = self._chunk, [], 0
+        self._slots.acquire()
+        future = self._pool.submit(self._send, chunk)
+        future.add_done_callback(lambda _: self._slots.release())
+        # finished futures can be dropped: _send never raises, its failures are in stats/errors
+        self._futures = [f for f in self._futures if not f.done()] + [future]
+
+    def _send(self, chunk):
+        try:
+            self._send_chunk(chunk)
+        except Exception as e:
+            self._give_up(chunk, f"unexpected error: {e!r}")
+
+    def _send_chunk(self, chunk):
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(min(10.0, self.backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0))
+            try:
+                with span("OpenSearchBulk"):
+                    resp = self.client.bulk(body="".join(lines for _, lines in chunk))
+            except Exception as e:
+                if attempt < self.max_retries:
+                    continue
+                self._give_up(chunk, f"bulk request failed: {e}")
+                return
+
+            items = resp.get("items", [])
+            if len(items) != len(chunk):
+                self._give_up(chunk, f"bulk response has {len(items)} items for {len(chunk)} documents")
+                return
+            retry = []
+            done = Counter()
+            for (doc_id, lines), item in zip(chunk, items):
+                op, result = next(iter(item.items()))
+                status = result.get("status", 500)
+                if status < 300 or (op == "delete" and status == 404):
+                    done[op] += 1
+                elif status in RETRY_STATUSES and attempt < self.max_retries:
+                    retry.append((doc_id, lines))
+                else:
+                    self._give_up([(doc_id, lines)], f"{status}: {result.get('error')}")
+            with self._lock:
+                self.stats.update(done)
+                self.stats["retried"] += len(retry)
+            if not retry:
+                return
+            chunk = retry
+
+    def _give_up(self, chunk, reason: str):
+        with self._lock:
+            self.stats["failed"] += len(chunk)
+            self.errors.extend((doc_id, reason) for doc_id, _ in chunk)
+        print(f"[ERROR] OpenSearch rejected {len(chunk)} documents: {reason}")
+
+
+class ActionFile:
+    """The same index/delete actions written as `_bulk` NDJSON to a file instead of a cluster."""
+
+    def __init__(self, path: str, index: str, append: bool = False):
+        self.path = path
+        self.index_name = index
+        self.stats = Counter()
+        self._out = open(path, "a" if append else "w")
+
+    def index(self, doc_id: str, doc: dict):
+        self._out.write(json.dumps({"index": {"_index": self.index_name, "_id": doc_id}}) + "\n")
+        self._out.write(json.dumps(doc, default=str) + "\n")
+        self.stats["index"] += 1
+
+    def delete(self, doc_id: str):
+        self._out.write(json.dumps({"delete": {"_index": self.index_name, "_id": doc_id}}) + "\n")
+        self.stats["delete"] += 1
+
+    def close(self) -> dict:
+        self._out.close()
+        return dict(self.stats)
@@ -0,0 +1,129 @@
+"""
+Multi-factor ranking of candidate restaurants.
+
+Features are laid out once per candidate list as column arrays (rating, review count,
+price, latitude, longitude) and scored against a weight vector in one pass; the best
+`k` are picked with partial selection instead of a full sort. NumPy is used when it
+is installed (argpartition over float arrays); otherwise the same columns are plain
+`array('d')` and selection uses heapq.
+"""
+import heapq
+import math
+import os
+from array import array
+
+from geo import EARTH_RADIUS_KM
+
+try:
+    import numpy as np
+except ImportError:  # not in the default Lambda runtime; ship it in a layer to enable
+    np = None
+
+FEATURES = ("rating", "reviews", "price", "distance")
+DISTANCE_SCALE_KM = float(os.getenv("DISTANCE_SCALE_KM", "2"))
+REVIEW_SCALE = int(os.getenv("REVIEW_SCALE", "1000"))  # review count that earns the full review score
+# cheaper is better when the price weight is positive; unknown price sits in the middle
+PRICE_SCORES = {"$": 1.0, "$$": 2 / 3, "$$$": 1 / 3, "$$$$": 0.0}
+UNKNOWN_PRICE_SCORE = 0.5
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """'rating=0.6,reviews=0.15,distance=0.25' -> weights for every feature (missing ones are 0)."""
+    weights = dict.fromkeys(FEATURES, 0.0)
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"Unknown ranking feature {name!r}, expected one of {FEATURES}")
+        weights[name] = float(value)
+    return weights
+
+
+RANK_WEIGHTS = parse_weights(os.getenv("RANK_WEIGHTS", "rating=0.6,reviews=0.15,distance=0.25"))
+
+
+class Columns:
+    """Feature columns for a fixed list of restaurants, each scaled to 0..1 (coordinates as radians)."""
+
+    def __init__(self, restaurants):
+        self.restaurants = list(restaurants)
+        self.pos = {r.business_id: i for i, r in enumerate(self.restaurants)}
+        review_norm = math.log1p(REVIEW_SCALE)
+        nan = float("nan")
+        columns = {
+            "rating": [r.rating / 5.0 for r in self.restaurants],
+            "reviews": [min(math.log1p(r.review_count) / review_norm, 1.0) for r in self.restaurants],
+            "price": [PRICE_SCORES.get(r.price, UNKNOWN_PRICE_SCORE) for r in self.restaurants],
+            "lat": [math.radians(r.latitude) if r.latitude is not None else nan for r in self.restaurants],
+            "lon": [math.radians(r.longitude) if r.longitude is not None else nan for r in self.restaurants],
+        }
+        make = np.array if np is not None else (lambda values: array("d", values))
+        self.columns = {name: make(values) for name, values in columns.items()}
+        self._static = {}  # weights tuple -> weighted sum of the location-independent features
+
+    def __len__(self):
+        return len(self.restaurants)
+
+    def top_k(self, k: int, origin: tuple[float, float] | None = None, weights: dict = RANK_WEIGHTS,
+              idx=None) -> list:
+        """The `k` best restaurants (of those at positions `idx`, default all) by weighted score, best first."""
+        if idx is not None and not isinstance(idx, list):
+            idx = list(idx)
+        n = len(self.restaurants) if idx is None else len(idx)
+        if k <= 0 or not n:
+            return []
+        if np is not None:
+            return self._top_k_numpy(k, origin, weights, idx, n)
+
+        scores = self._static_scores(weights)
+        if origin is not None and weights["distance"]:
+            scores = array("d", scores)
+            for i in range(len(self.restaurants)) if idx is None else idx:
+                scores[i] += weights["distance"] * self._closeness(i, origin)
+        best = heapq.nlargest(k, range(len(self.restaurants)) if idx is None else idx, key=scores.__getitem__)
+        return [self.restaurants[i] for i in best]
+
+    def _static_scores(self, weights: dict):
+        key = tuple(weights[f] for f in FEATURES[:3])
+        scores = self._static.get(key)
+        if scores is None:
+            c = self.columns
+            if np is not None:
+                scores = key[0] * c["rating"] + key[1] * c["reviews"] + key[2] * c["price"]
+            else:
+                scores = array("d", (key[0] * a + key[1] * b + key[2] * p
+                                     for a, b, p in zip(c["rating"], c["reviews"], c["price"])))
+            self._static[key] = scores
+        return scores
+
+    def _closeness(self, i: int, origin: tuple[float, float]) -> float:
+        lat, lon = self.columns["lat"][i], self.columns["lon"][i]
+        if lat != lat:  # NaN: no coordinates
+            return 0.0
+        p1 = math.radians(origin[0])
+        a = math.sin((lat - p1) / 2) ** 2 + math.cos(p1) * math.cos(lat) * math.sin((lon - math.radians(origin[1])) / 2) ** 2
+        return math.exp(-2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a)) / DISTANCE_SCALE_KM)
+
+    def _top_k_numpy(self, k, origin, weights, idx, n):
+        sel = slice(None) if idx is None else np.asarray(idx, dtype=np.intp)
+        scores = self._static_scores(weights)[sel]
+        if origin is not None and weights["distance"]:
+            lat, lon = self.columns["lat"][sel], self.columns["lon"][sel]
+            p1 = math.radians(origin[0])
+            a = np.sin((lat - p1) / 2) ** 2 + math.cos(p1) * np.cos(lat) * np.sin((lon - math.radians(origin[1])) / 2) ** 2
+            closeness = np.exp(-2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)) / DISTANCE_SCALE_KM)
+            scores = scores + weights["distance"] * np.nan_to_num(closeness, nan=0.0)
+        if k < n:
+            # partial selection around the k-th best score; ties at the cut go to earlier
+            # candidates, matching heapq.nlargest in the pure-Python path
+            kth = np.partition(scores, n - k)[n - k]
+            above = np.flatnonzero(scores > kth)
+            part = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+        else:
+            part = np.arange(n)
+        best = part[np.argsort(-scores[part], kind="stable")]
+        if idx is not None:
+            best = np.asarray(idx)[best]
+        return [self.restaurants[i] for i in best.tolist()]
@@ -0,0 +1,125 @@
+"""
+Display formatting for restaurant records, shared by YelpFetch (which stores a
+precomputed `display` projection on every item) and LF2 (which falls back to
+formatting on the fly for items written before the projection existed).
+"""
+import html
+from decimal import Decimal
+
+
+def val_of(x):
+    """Return plain Python value from DynamoDB attribute or raw value."""
+    if isinstance(x, dict) and len(x) == 1 and next(iter(x)) in {"S", "N", "BOOL"}:
+        t, v = next(iter(x.items()))
+        if t == "N":
+            try:
+                return Decimal(v)
+            except Exception:
+                return v
+        return v
+    return x
+
+
+def get_attr(d: dict, *path, default=None):
+    """Safe nested getter supporting DynamoDB-export shapes."""
+    cur = d
+    for p in path:
+        if cur is None:
+            return default
+        cur = cur.get(p)
+    return val_of(cur) if cur is not None else default
+
+
+def build_address(r: dict) -> str:
+    # Use 'address' if already flattened; else compose from location + zip
+    addr = val_of(r.get("address"))
+    if addr:
+        return str(addr)
+
+    a1 = get_attr(r, "location", "address1") or ""
+    a2 = get_attr(r, "location", "address2") or ""
+    city = get_attr(r, "location", "city") or ""
+    state = get_attr(r, "location", "state") or ""
+    zipc = val_of(r.get("zip_code")) or get_attr(r, "location", "zip_code") or ""
+
+    parts = [p for p in [a1, a2] if p]
+    citystate = ", ".join(p for p in [city, state] if p)
+    if citystate:
+        parts.append(citystate)
+    if zipc:
+        parts.append(str(zipc))
+    return ", ".join(parts) or "N/A"
+
+
+def format_rating(r) -> str:
+    r = val_of(r)
+    if isinstance(r, Decimal):
+        return f"{float(r):.1f}"
+    try:
+        return f"{float(r):.1f}"
+    except Exception:
+        return str(r) if r is not None else "N/A"
+
+
+def extract_hhmm(val) -> str | None:
+    if val is None:
+        return None
+    if isinstance(val, dict) and "S" in val:  # export-style {"S":"0700"}
+        val = val["S"]
+    s = str(val).strip()
+    return s if s else None
+
+
+def format_hhmm(s: str) -> str:
+    s = str(s).strip()
+    if ":" in s:
+        hh, mm = s.split(":")
+    else:
+        hh, mm = s[:2], s[2:4] if len(s) >= 4 else "00"
+    return f"{int(hh):02d}:{int(mm):02d}"
+
+
+def format_business_hours(hours):
+    """
+    Accepts:
+      • dict: {"start": "0700", "end": "2300"}   (or {"start":{"S":"0700"}})
+      • list of such dicts (multiple windows)
+    Returns (text_version, html_version) like '07:00–23:00'. start==end → 'Open 24 hours'.
+    """
+    if not hours:
+        return ("Not provided", "Not provided")
+
+    def window_to_str(win: dict) -> str | None:
+        s_raw = extract_hhmm(win.get("start"))
+        e_raw = extract_hhmm(win.get("end"))
+        if not s_raw or not e_raw:
+            return None
+        if s_raw == e_raw:
+            return "Open 24 hours"
+        return f"{format_hhmm(s_raw)}–{format_hhmm(e_raw)}"
+
+    windows = []
+    if isinstance(hours, dict) and ("start" in hours or "end" in hours):
+        windows = [hours]
+    elif isinstance(hours, (list, tuple)):
+        windows = [w for w in hours if isinstance(w, dict)]
+
+    out = [w for w in (window_to_str(w) for w in windows) if w]
+    if not out:
+        return ("Not provided", "Not provided")
+
+    text = "\n".join(out)
+    html_lines = "<br>".join(html.escape(line) for line in out)
+    return (text, html_lines)
+
+
+def display_projection(r: dict) -> dict:
+    """Everything the email rows show, already composed and formatted."""
+    hours_text, hours_html = format_business_hours(r.get("business_hours"))
+    return {
+        "name": str(val_of(r.get("name")) or "N/A"),
+        "address": build_address(r),
+        "rating": format_rating(r.get("rating")),
+        "hours_text": hours_text,
+        "hours_html": hours_html,
+    }
@@ -0,0 +1,81 @@
+"""
+Compact restaurant record used on LF2's hot path.
+
+Built once where items enter LF2 (BatchGetItem, caches, snapshots) with numeric
+fields already parsed and opening hours already converted to intervals, so the
+rest of the request never touches raw DynamoDB dicts again.
+"""
+from dataclasses import dataclass, field
+
+from opening_hours import item_intervals
+from restaurant_display import display_projection
+
+
+@dataclass(slots=True)
+class Restaurant:
+    business_id: str
+    name: str = "N/A"
+    cuisine: str = ""
+    rating: float = 0.0
+    review_count: int = 0
+    price: str = "N/A"
+    zip_code: str = ""
+    latitude: float | None = None
+    longitude: float | None = None
+    open_intervals: tuple = ()
+    display: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_item(cls, item: dict) -> "Restaurant":
+        """From a plain item: YelpFetch's shape or a boto3 resource (Decimal numbers) response."""
+        coords = item.get("coordinates") or {}
+        display = item.get("display") or display_projection(item)
+        return cls(
+            business_id=item.get("business_id"),
+            name=str(item.get("name") or "N/A"),
+            cuisine=item.get("cuisine") or "",
+            rating=_to_float(item.get("rating")) or 0.0,
+            review_count=int(item.get("review_count") or 0),
+            price=item.get("price") or "N/A",
+            zip_code=item.get("zip_code") or "",
+            latitude=_to_float(coords.get("latitude")),
+            longitude=_to_float(coords.get("longitude")),
+            open_intervals=tuple((lo, hi) for lo, hi in item_intervals(item)),
+            display=display,
+        )
+
+    @classmethod
+    def from_wire(cls, item: dict) -> "Restaurant":
+        """From a low-level DynamoDB item ({"S": ...}, {"N": ...}, ...) without boto3's TypeDeserializer."""
+        return cls.from_item({k: _unwire(v) for k, v in item.items()})
+
+    def approx_size(self) -> int:
+        return 200 + len(self.name) + 16 * len(self.open_intervals) + sum(len(str(v)) for v in self.display.values())
+
+
+def _to_float(x) -> float | None:
+    if x is None:
+        return None
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+
+def _unwire(v):
+    if not isinstance(v, dict) or len(v) != 1:
+        return v
+    t, x = next(iter(v.items()))
+    if t == "S":
+        return x
+    if t == "N":
+        return float(x) if any(c in x for c in ".eE") else int(x)
+    if t == "M":
+        return {k: _unwire(y) for k, y in x.items()}
+    if t == "L":
+        return [_unwire(y) for y in x]
+    if t == "BOOL":
+        return x
+    if t == "NULL":
+        return None
+    return x
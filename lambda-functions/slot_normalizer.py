@@ -0,0 +1,200 @@
+"""
+Slot normalization for LF1's dining dialog.
+
+Lex passes slot values through as the user typed them whenever its built-in types do
+not resolve them, and every value LF1 rejects costs another elicit round trip through
+Lex, LF0 and the browser. These normalizers accept the common spellings instead:
+cuisine synonyms (Yelp category aliases of each cuisine) with fuzzy matching for
+typos, "7pm" / "7:30 pm" / "noon" style times, party sizes in words, and locations
+canonicalized against the gazetteer in `geo`. Lookup tables and patterns are built
+once at import; each normalizer returns None when it cannot make sense of the value.
+"""
+import difflib
+import os
+import re
+import string
+from functools import lru_cache
+
+from geo import gazetteer_name
+
+# Yelp category aliases (and everyday words) that fall under each cuisine LF2 serves
+CATEGORY_ALIASES = {
+    "chinese": (
+        "cantonese", "szechuan", "sichuan", "dimsum", "dim sum", "hotpot", "hot pot", "shanghainese",
+        "hainan", "noodles", "dumplings", "china",
+    ),
+    "japanese": (
+        "sushi", "ramen", "izakaya", "teppanyaki", "tonkatsu", "udon", "robatayaki", "japacurry",
+        "conveyorsushi", "yakitori", "japan",
+    ),
+    "italian": ("pizza", "pasta", "pastashops", "tuscan", "sicilian", "calabrian", "sardinian", "italy"),
+    "mexican": ("tacos", "taqueria", "tex-mex", "texmex", "burritos", "newmexican", "mexico"),
+    "american": (
+        "tradamerican", "newamerican", "burgers", "bbq", "barbeque", "steak", "steakhouses", "diners",
+        "diner", "southern", "soulfood", "hotdogs", "chicken_wings", "wings", "usa",
+    ),
+}
+# extra "synonym=cuisine" pairs, e.g. "omakase=japanese,slice=italian"
+CUISINE_SYNONYMS = os.getenv("CUISINE_SYNONYMS", "")
+FUZZY_CUTOFF = float(os.getenv("FUZZY_CUTOFF", "0.8"))
+MAX_PARTY_SIZE = int(os.getenv("MAX_PARTY_SIZE", "20"))
+# words close to a cuisine alias that must not be read as one ("dinner" ~ "diner")
+NOT_CUISINES = {"dinner", "dinners", "lunch", "food", "foods", "place", "places", "restaurant", "restaurants",
+                "something", "anything", "please", "cuisine", "tonight"}
+# cuisines LF2 may not serve, spelled close to one it does ("african" ~ "american"); they
+# only match exactly, when configured
+OTHER_CUISINES = {"african", "korean", "thai", "indian", "french", "greek", "spanish", "vietnamese", "turkish",
+                  "lebanese", "ethiopian", "caribbean", "cuban", "peruvian", "brazilian", "german", "russian",
+                  "filipino", "malaysian", "indonesian", "mediterranean", "persian", "moroccan", "irish"}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20,
+    "a couple": 2, "couple": 2, "a pair": 2, "pair": 2, "a dozen": 12, "dozen": 12,
+    "just me": 1, "myself": 1, "solo": 1, "alone": 1,
+}
+TENS_WORDS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80,
+              "ninety": 90}
+UNIT_WORDS = ("one", "two", "three", "four", "five", "six", "seven", "eight", "nine")
+# city-wide names, all spelled one way
+CITY_NAMES = {"nyc": "New York", "new york": "New York", "new york city": "New York", "ny": "New York"}
+
+
+def _cuisine_table(cuisines) -> dict[str, str]:
+    table = {c: c for c in cuisines}
+    for cuisine, aliases in CATEGORY_ALIASES.items():
+        if cuisine in table:
+            table.update((alias, cuisine) for alias in aliases)
+    for part in CUISINE_SYNONYMS.split(","):
+        word, _, cuisine = part.partition("=")
+        if word.strip() and cuisine.strip() in table:
+            table[word.strip().lower()] = cuisine.strip()
+    return table
+
+
+class SlotNormalizer:
+    def __init__(self, cuisines):
+        self.cuisines = _cuisine_table(cuisines)
+        # single words for fuzzy matching; phrases ("dim sum") only match exactly
+        self.vocabulary = sorted(w for w in self.cuisines if " " not in w)
+        # cuisine names first ("southern italian" is italian), then longer aliases before shorter ones
+        self.cuisine_phrases = [(re.compile(rf"\b{re.escape(w)}\b"), c)
+                                for w, c in sorted(self.cuisines.items(), key=lambda kv: (kv[0] != kv[1], -len(kv[0])))]
+        # as a method-level cache: one entry per distinct typo, shared across warm invocations
+        self.fuzzy = lru_cache(maxsize=1024)(self._fuzzy)
+
+    def cuisine(self, text: str | None) -> str | None:
+        """'Sushi' -> 'japanese', 'itallian food' -> 'italian'."""
+        s = _clean(text)
+        if not s:
+            return None
+        if s in self.cuisines:
+            return self.cuisines[s]
+        for pattern, cuisine in self.cuisine_phrases:
+            if pattern.search(s):
+                return cuisine
+        for word in _WORD_RE.findall(s):
+            if len(word) >= 4 and word not in NOT_CUISINES and word not in OTHER_CUISINES:
+                cuisine = self.fuzzy(word)
+                if cuisine:
+                    return cuisine
+        return None
+
+    def _fuzzy(self, word: str) -> str | None:
+        """The cuisine every close match of `word` belongs to; None when there is none or they disagree."""
+        matches = {self.cuisines[m] for m in difflib.get_close_matches(word, self.vocabulary, n=3, cutoff=FUZZY_CUTOFF)}
+        return matches.pop() if len(matches) == 1 else None
+
+
+_WORD_RE = re.compile(r"[a-z][a-z_-]+")
+_TIME_RE = re.compile(
+    r"\b(?P<h>\d{1,2})(?:\s*[:.]\s*(?P<m>\d{2}))?\s*(?P<ampm>(?:a|p)\.?\s?m\.?(?![a-z]))?(?![\d:])")
+_COMPACT_TIME_RE = re.compile(r"^(?P<h>[01]\d|2[0-3])(?P<m>[0-5]\d)$")  # "1930"
+_NAMED_TIMES = {"noon": "12:00", "midday": "12:00", "midnight": "00:00"}
+_NAMED_TIME_RE = re.compile(r"\b(" + "|".join(_NAMED_TIMES) + r")\b")
+_PARTY_RE = re.compile(r"\b(\d{1,3})\b")
+# "twenty-two", "thirty one": parsed whole so "two" alone is not taken from them
+_COMPOUND_NUMBER_RE = re.compile(rf"\b({'|'.join(TENS_WORDS)})(?:[\s-]+({'|'.join(UNIT_WORDS)}))?\b")
+_SCALE_WORDS_RE = re.compile(r"\b(?:hundred|thousand)s?\b")
+_NUMBER_WORDS_RE = re.compile(r"\b(" + "|".join(sorted(map(re.escape, NUMBER_WORDS), key=len, reverse=True)) + r")\b")
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[a-z]{2,}$")
+_SPOKEN_AT_RE = re.compile(r"\s+(?:at|\(at\)|\[at\])\s+")
+_SPOKEN_DOT_RE = re.compile(r"\s+(?:dot|\(dot\)|\[dot\])\s+")
+
+
+def _clean(text) -> str:
+    return " ".join(str(text).lower().split()) if text else ""
+
+
+def dining_time(text: str | None) -> str | None:
+    """
+    '7pm' -> '19:00', '7:30 pm' -> '19:30', 'noon' -> '12:00', '19:00' -> '19:00'. A bare
+    hour of 1-11 without am/pm ('7:30') could be either, so it is None and Lex asks again.
+    """
+    s = _clean(text)
+    if not s:
+        return None
+    named = _NAMED_TIME_RE.search(s)
+    if named:
+        return _NAMED_TIMES[named.group(1)]
+    m = _COMPACT_TIME_RE.match(s)
+    if m is None:
+        m = next((m for m in _TIME_RE.finditer(s) if m.group("m") or m.group("ampm")), None)
+    if m is None:
+        return None
+    hour, minute = int(m.group("h")), int(m.group("m") or 0)
+    ampm = (m.groupdict().get("ampm") or "").replace(".", "").replace(" ", "")
+    if ampm:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if ampm == "pm" else 0)
+    elif 1 <= hour <= 11 and not m.group("h").startswith("0"):
+        return None  # "7:30" is morning or evening; "07:30" and "0730" are 24-hour
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+
+def party_size(text: str | None) -> str | None:
+    """'4', 'party of four', 'two' -> digits; None outside 1..MAX_PARTY_SIZE."""
+    s = _clean(text)
+    if not s:
+        return None
+    m = _PARTY_RE.search(s)
+    if m:
+        n = int(m.group(1))
+    elif _SCALE_WORDS_RE.search(s):
+        return None  # "one hundred" is not a party of one
+    elif m := _COMPOUND_NUMBER_RE.search(s):
+        n = TENS_WORDS[m.group(1)] + (UNIT_WORDS.index(m.group(2)) + 1 if m.group(2) else 0)
+    else:
+        m = _NUMBER_WORDS_RE.search(s)
+        if not m:
+            return None
+        n = NUMBER_WORDS[m.group(1)]
+    return str(n) if 1 <= n <= MAX_PARTY_SIZE else None
+
+
+def location(text: str | None) -> str | None:
+    """'dinner in park slope' -> 'Park Slope', 'nyc' -> 'New York'; other places are kept, tidied."""
+    s = _clean(text)
+    if not s:
+        return None
+    if s in CITY_NAMES:
+        return CITY_NAMES[s]
+    name = gazetteer_name(s)
+    if name:
+        return string.capwords(name)
+    return " ".join(str(text).split())
+
+
+def email(text: str | None) -> str | None:
+    """Trimmed address with a lower-cased domain; 'jo at example dot com' is accepted too."""
+    s = " ".join(str(text).split()) if text else ""
+    if "@" not in s:
+        s = _SPOKEN_DOT_RE.sub(".", _SPOKEN_AT_RE.sub("@", s.lower()))
+    s = s.replace(" ", "").rstrip(".")
+    local, _, domain = s.partition("@")
+    s = f"{local}@{domain.lower()}"
+    return s if _EMAIL_RE.match(s) else None
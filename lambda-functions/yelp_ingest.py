@@ -0,0 +1,217 @@
+import os
+import time
+import random
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+from instrumentation import count, log, span
+
+# Point YELP_SEARCH_URL at a local stub server to run ingestion offline
+YELP_SEARCH_URL = os.environ.get("YELP_SEARCH_URL", "https://api.yelp.com/v3/businesses/search")
+PAGE_SIZE = 50
+MAX_RESULTS_PER_CATEGORY = int(os.environ.get("MAX_RESULTS_PER_CATEGORY", "200"))
+MAX_WORKERS = int(os.environ.get("YELP_MAX_WORKERS", "8"))
+MAX_RETRIES = int(os.environ.get("YELP_MAX_RETRIES", "5"))
+# Yelp Fusion allows a handful of calls per second per key
+REQUESTS_PER_SECOND = float(os.environ.get("YELP_REQUESTS_PER_SECOND", "5"))
+REQUEST_TIMEOUT = float(os.environ.get("YELP_REQUEST_TIMEOUT", "10"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by all workers."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def make_session(api_key: str, pool_size: int = MAX_WORKERS) -> requests.Session:
+    """One keep-alive session whose connection pool is sized for the worker pool."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "accept": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    })
+    return session
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(30.0, 0.5 * (2 ** attempt)) + random.uniform(0, 0.25)
+
+
+def fetch_page(session, params: dict, *, url: str = YELP_SEARCH_URL, limiter: RateLimiter | None = None,
+               max_retries: int = MAX_RETRIES) -> dict:
+    """GET one search page, backing off on 429/5xx and connection errors."""
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            with span("YelpSearch"):
+                response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            if attempt == max_retries:
+                raise
+            delay = _backoff(attempt)
+            log("WARN", f"Yelp request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < max_retries:
+            count("YelpRetries")
+            delay = _backoff(attempt, response.headers.get("Retry-After"))
+            log("WARN", f"Yelp returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        response.raise_for_status()
+        return response.json()
+
+    raise RuntimeError("unreachable")
+
+
+def shard_key(location: str, category: str) -> str:
+    return f"{location}|{category}"
+
+
+class Checkpoint:
+    """
+    Per-shard ingestion progress. `next_offset` only advances over a contiguous run of
+    finished pages, so a restart never skips a page that was still in flight.
+    """
+
+    def __init__(self, state: dict | None = None):
+        self.shards = (state or {}).get("shards", {})
+        self._finished = {}  # shard key -> {offset: end offset} for out-of-order pages
+
+    def start_offset(self, key: str) -> int:
+        return self.shards.get(key, {}).get("next_offset", 0)
+
+    def is_done(self, key: str) -> bool:
+        return self.shards.get(key, {}).get("done", False)
+
+    def page_finished(self, key: str, offset: int, count: int, total: int | None = None):
+        shard = self.shards.setdefault(key, {"next_offset": 0, "total": None, "done": False})
+        if total is not None:
+            shard["total"] = total
+        if count == 0:
+            if offset == shard["next_offset"]:
+                shard["done"] = True
+            return
+
+        finished = self._finished.setdefault(key, {})
+        finished[offset] = offset + count
+        while shard["next_offset"] in finished:
+            shard["next_offset"] = finished.pop(shard["next_offset"])
+        if shard["total"] is not None and shard["next_offset"] >= shard["total"]:
+            shard["done"] = True
+
+    def to_state(self) -> dict:
+        return {"shards": self.shards}
+
+
+def iter_shard_pages(shards, term: str, *, api_key: str, url: str = YELP_SEARCH_URL,
+                     max_results: int = MAX_RESULTS_PER_CATEGORY, page_size: int = PAGE_SIZE,
+                     max_workers: int = MAX_WORKERS, requests_per_second: float = REQUESTS_PER_SECOND,
+                     start_offsets: dict | None = None, should_stop=None, failed: list | None = None):
+    """
+    Fetch pages of (location, category) shards concurrently and yield
+    (location, category, offset, businesses, total) as each page completes.
+
+    The first page of every shard, at its `start_offsets` entry (default 0), tells us the
+    shard's total, and the remaining offsets are only scheduled up to that total. Once
+    `should_stop()` returns True, queued pages are cancelled and only in-flight pages are
+    yielded. Pages that still fail after retries are logged and appended to `failed` as
+    (location, category, offset).
+    """
+    limiter = RateLimiter(requests_per_second)
+    session = make_session(api_key, pool_size=max_workers)
+    start_offsets = start_offsets or {}
+
+    def params_for(location, category, offset):
+        return {
+            "location": location,
+            "term": term,
+            "categories": category,
+            "sort_by": "best_match",
+            "limit": min(page_size, max_results - offset),
+            "offset": offset,
+        }
+
+    def run(location, category, offset):
+        return fetch_page(session, params_for(location, category, offset), url=url, limiter=limiter)
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        for location, category in shards:
+            start = start_offsets.get(shard_key(location, category), 0)
+            if start < max_results:
+                pending[pool.submit(run, location, category, start)] = (location, category, start)
+
+        stopping = False
+        while pending:
+            if not stopping and should_stop and should_stop():
+                stopping = True
+                cancelled = [f for f in pending if f.cancel()]
+                for future in cancelled:
+                    pending.pop(future)
+                log("WARN", f"Stopping early, cancelled {len(cancelled)} queued pages")
+                if not pending:
+                    break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                location, category, offset = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    print(f"[ERROR] Failed to fetch {location}/{category} offset={offset}: {e}")
+                    if failed is not None:
+                        failed.append((location, category, offset))
+                    continue
+
+                businesses = data.get("businesses", [])
+                total = min(int(data.get("total") or max_results), max_results)
+                first = offset == start_offsets.get(shard_key(location, category), 0)
+                if first and businesses and not stopping:
+                    for next_offset in range(offset + len(businesses), total, page_size):
+                        key = (location, category, next_offset)
+                        pending[pool.submit(run, *key)] = key
+
+                for biz in businesses:
+                    biz["queried_cuisine"] = category
+                yield location, category, offset, businesses, total
+
+
+def iter_pages(location: str, term: str, categories, *, api_key: str, **kwargs):
+    """Single-location form of `iter_shard_pages` yielding (category, offset, businesses)."""
+    shards = [(location, category) for category in categories]
+    for _, category, offset, businesses, _ in iter_shard_pages(shards, term, api_key=api_key, **kwargs):
+        yield category, offset, businesses
@@ -0,0 +1,154 @@
+"""
+Record-level validation of Yelp businesses for YelpFetch.
+
+Each business is checked and converted into a DynamoDB item in one pass over the raw
+JSON dict, without building a model object first. A record that fails is handed to
+a `Quarantine` together with the reason, instead of failing its whole page.
+"""
+import datetime
+import hashlib
+import json
+import math
+from collections import Counter
+from decimal import Decimal
+
+import aws_clients
+from instrumentation import log
+from opening_hours import weekly_intervals
+from restaurant_display import display_projection
+
+# field -> (accepted types, required)
+FIELDS = {
+    "id": (str, True),
+    "name": (str, True),
+    "categories": (list, True),
+    "coordinates": (dict, True),
+    "rating": ((int, float, Decimal), False),
+    "review_count": (int, False),
+    "price": (str, False),
+    "location": (dict, False),
+    "business_hours": (list, False),
+}
+LOCATION_FIELDS = ("address1", "address2", "address3", "city", "zip_code", "country", "state", "display_address")
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def _decimal(value, field: str) -> Decimal:
+    if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+        raise InvalidRecord(f"{field} is not a number")
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise InvalidRecord(f"{field} is not finite")
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+class BusinessValidator:
+    """
+    Field checks derived once from FIELDS and reused for every record. Calling the
+    validator returns the DynamoDB item or raises InvalidRecord.
+    """
+
+    def __init__(self, cuisines, fields: dict = FIELDS):
+        self.cuisines = frozenset(cuisines)
+        self.required = tuple(name for name, (_, required) in fields.items() if required)
+        self.types = tuple((name, types) for name, (types, _) in fields.items())
+
+    def __call__(self, biz) -> dict:
+        if not isinstance(biz, dict):
+            raise InvalidRecord("record is not an object")
+        for name in self.required:
+            if biz.get(name) in (None, "", [], {}):
+                raise InvalidRecord(f"missing {name}")
+        for name, types in self.types:
+            value = biz.get(name)
+            if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+                raise InvalidRecord(f"{name} has type {type(value).__name__}")
+        return self.to_item(biz)
+
+    def to_item(self, biz: dict) -> dict:
+        coords = biz["coordinates"]
+        location = biz.get("location") or {}
+        hours = biz.get("business_hours") or []
+        first = hours[0] if hours else None
+        windows = (first.get("open") or []) if isinstance(first, dict) else []
+        if not isinstance(windows, list) or not all(isinstance(w, dict) for w in windows):
+            raise InvalidRecord("business_hours.open is not a list of windows")
+
+        aliases = [c.get("alias") for c in biz["categories"] if isinstance(c, dict)]
+        item = {
+            "cuisine": next((a for a in aliases if a in self.cuisines), biz.get("queried_cuisine", "other")),
+            "business_id": biz["id"],
+            "name": biz["name"],
+            "review_count": biz.get("review_count") or 0,
+            "rating": _decimal(biz["rating"], "rating") if biz.get("rating") is not None else Decimal("0"),
+            "coordinates": {
+                "latitude": _decimal(coords.get("latitude"), "coordinates.latitude"),
+                "longitude": _decimal(coords.get("longitude"), "coordinates.longitude"),
+            },
+            "price": biz.get("price") or "N/A",
+            "location": {name: location.get(name) for name in LOCATION_FIELDS},
+            "zip_code": location.get("zip_code") or "00000",
+            "business_hours": {"start": windows[0].get("start"), "end": windows[0].get("end")} if windows else {},
+            # every weekly window as [start, end) minute-of-week intervals, for LF2's hours index
+            "open_intervals": weekly_intervals(windows),
+        }
+        # composed address and formatted rating/hours, so LF2 never formats on the hot path
+        item["display"] = display_projection(item)
+        return item
+
+
+class Quarantine:
+    """
+    Rejected records with their reasons, flushed at the end of a run as JSON lines to a
+    local file or as items of a DynamoDB table (business_id + quarantined_at key).
+    """
+
+    def __init__(self, path: str = "", table_name: str = ""):
+        self.path = path
+        self.table_name = table_name
+        self.records = []
+        self.reasons = Counter()
+
+    def add(self, biz, reason: str, shard: str | None = None):
+        self.reasons[reason] += 1
+        self.records.append({
+            "business_id": biz.get("id") if isinstance(biz, dict) and isinstance(biz.get("id"), str) else None,
+            "reason": reason,
+            "shard": shard,
+            "record": biz,
+        })
+
+    def flush(self) -> int:
+        """Write out and forget the collected records; returns how many were written."""
+        records, self.records = self.records, []
+        if not records:
+            return 0
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        try:
+            if self.table_name:
+                with aws_clients.table(self.table_name).batch_writer() as batch:
+                    for i, rec in enumerate(records):
+                        raw = json.dumps(rec["record"], default=str)
+                        batch.put_item(Item={
+                            "business_id": rec["business_id"] or "unknown#" + hashlib.sha1(raw.encode("utf-8")).hexdigest(),
+                            "quarantined_at": f"{now}#{i}",
+                            "reason": rec["reason"],
+                            "shard": rec["shard"] or "",
+                            "record": raw,
+                        })
+            elif self.path:
+                with open(self.path, "a") as f:
+                    for rec in records:
+                        f.write(json.dumps({**rec, "quarantined_at": now}, default=str) + "\n")
+            else:
+                return 0
+        except Exception as e:
+            print(f"[ERROR] Failed to write {len(records)} quarantined records: {e}")
+            return 0
+        log("WARN", f"Quarantined {len(records)} records to {self.table_name or self.path}: {dict(self.reasons)}")
+        self.reasons.clear()
+        return len(records)
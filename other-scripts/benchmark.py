@@ -0,0 +1,549 @@
+"""
+Local benchmark for the recommendation pipeline.
+
+Drives LF2.lambda_handler (remote, leaderboard and embedded-snapshot modes, and redelivered
+batches), filter_by_dining_time, candidate ranking (full sort vs. column scoring with top-k),
+the email builders, LF1's slot normalization, OpenSearch bulk re-indexing,
+YelpFetch.validate_and_parse_fetched_data and yelp_ingest paging, retries and checkpoint
+resume against synthetic catalogs, with in-memory stand-ins for OpenSearch, DynamoDB and
+SES seeded from restaurant.json and the local Yelp stub in yelp_stub_server.py.
+Reports throughput, p50/p99 latency and peak memory, and writes them as JSON so
+runs from different commits can be compared:
+
+    python other-scripts/benchmark.py --sizes 1000,100000 --out bench/$(git rev-parse --short HEAD).json
+    python other-scripts/benchmark.py --sizes 1000 --compare bench/abc1234.json
+
+Needs the lambdas' own dependencies (boto3; requests for the YelpFetch scenarios,
+which are skipped when it cannot be imported).
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "lambda-functions"))
+os.environ.setdefault("YELP_API_KEY", "benchmark")
+os.environ.setdefault("QUEUE_URL", "benchmark")
+
+import LF2  # noqa: E402
+from catalog_snapshot import CatalogSnapshot, build_snapshot  # noqa: E402
+import ranking  # noqa: E402
+from geo import GAZETTEER, haversine_km  # noqa: E402
+from restaurant_record import Restaurant  # noqa: E402
+from restaurant_display import display_projection  # noqa: E402
+from opening_hours import weekly_intervals  # noqa: E402
+from opensearch_bulk import BulkIndexer, search_document  # noqa: E402
+from leaderboard import build_leaderboards  # noqa: E402
+from idempotency import MemoryIdempotencyStore  # noqa: E402
+
+SEED_FILE = os.path.join(HERE, "restaurant.json")
+CUISINES = ["chinese", "japanese", "italian", "mexican", "american"]
+
+
+# ========== Synthetic catalog ===============================================
+
+def seed_ids() -> list[tuple[str, str]]:
+    """(cuisine, restaurant_id) pairs from the OpenSearch bulk file."""
+    pairs = []
+    with open(SEED_FILE) as f:
+        for line in f:
+            doc = json.loads(line)
+            if "restaurant_id" in doc:
+                pairs.append((doc["cuisine"], doc["restaurant_id"]))
+    return pairs
+
+
+def random_hours(rng: random.Random) -> list[dict]:
+    start = rng.choice([700, 900, 1100, 1200, 1700])
+    end = rng.choice([1500, 2100, 2200, 2300, 200])
+    days = sorted(rng.sample(range(7), rng.randint(5, 7)))
+    return [{"day": d, "start": f"{start:04d}", "end": f"{end:04d}", "is_overnight": end < start} for d in days]
+
+
+def yelp_business(rng: random.Random, cuisine: str, rid: str) -> dict:
+    """A business in Yelp search-response shape."""
+    return {
+        "id": rid,
+        "name": f"Restaurant {rid[:8]}",
+        "categories": [{"alias": cuisine, "title": cuisine.title()}],
+        "rating": rng.choice([3.0, 3.5, 4.0, 4.5, 5.0]),
+        "review_count": rng.randint(0, 3000),
+        "coordinates": {"latitude": 40.6 + rng.random() / 10, "longitude": -74.0 + rng.random() / 10},
+        "price": rng.choice(["$", "$$", "$$$", None]),
+        "location": {
+            "address1": f"{rng.randint(1, 999)} Main St",
+            "address2": "",
+            "address3": "",
+            "city": "Brooklyn",
+            "zip_code": f"112{rng.randint(0, 99):02d}",
+            "country": "US",
+            "state": "NY",
+            "display_address": [],
+        },
+        "business_hours": [{"open": random_hours(rng), "hours_type": "REGULAR", "is_open_now": True}],
+        "queried_cuisine": cuisine,
+    }
+
+
+def dynamo_item(biz: dict) -> dict:
+    """The item YelpFetch would write for `biz`."""
+    windows = biz["business_hours"][0]["open"]
+    item = {
+        "cuisine": biz["queried_cuisine"],
+        "business_id": biz["id"],
+        "name": biz["name"],
+        "review_count": biz["review_count"],
+        "rating": Decimal(str(biz["rating"])),
+        "coordinates": {k: Decimal(str(v)) for k, v in biz["coordinates"].items()},
+        "price": biz["price"] or "N/A",
+        "location": biz["location"],
+        "zip_code": biz["location"]["zip_code"],
+        "business_hours": {"start": windows[0]["start"], "end": windows[0]["end"]},
+        "open_intervals": weekly_intervals(windows),
+    }
+    item["display"] = display_projection(item)
+    return item
+
+
+def build_catalog(size: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    pairs = seed_ids()
+    while len(pairs) < size:
+        pairs.append((rng.choice(CUISINES), f"synthetic-{len(pairs):07d}"))
+    return [yelp_business(rng, cuisine, rid) for cuisine, rid in pairs[:size]]
+
+
+def to_wire(v):
+    if isinstance(v, bool):
+        return {"BOOL": v}
+    if isinstance(v, (int, float, Decimal)):
+        return {"N": str(v)}
+    if isinstance(v, str):
+        return {"S": v}
+    if isinstance(v, dict):
+        return {"M": {k: to_wire(x) for k, x in v.items()}}
+    if isinstance(v, (list, tuple)):
+        return {"L": [to_wire(x) for x in v]}
+    return {"NULL": True}
+
+
+# ========== In-memory AWS stand-ins =========================================
+
+class FakeOpenSearch:
+    def __init__(self, items: list[dict]):
+        self.by_cuisine = {}
+        self.coords = {}
+        for it in items:
+            self.by_cuisine.setdefault(it["cuisine"], []).append(it["business_id"])
+            c = it.get("coordinates") or {}
+            self.coords[it["business_id"]] = (float(c.get("latitude", 0)), float(c.get("longitude", 0)))
+        self.shuffled = {}
+        self.nearest = {}
+
+    def search(self, index, body):
+        query = body["query"]
+        seed = None
+        if "function_score" in query:
+            seed = query["function_score"]["random_score"]["seed"]
+            query = query["function_score"]["query"]
+        cuisine = next(iter(query["term"].values()))
+        ids = self.by_cuisine.get(cuisine, [])
+        if seed is not None:
+            key = (cuisine, seed)
+            if key not in self.shuffled:
+                self.shuffled[key] = random.Random(seed).sample(ids, len(ids))
+            ids = self.shuffled[key]
+        for sort in body.get("sort", []):
+            point = sort["_geo_distance"]["location"]
+            key = (cuisine, point["lat"], point["lon"])
+            if key not in self.nearest:
+                self.nearest[key] = sorted(ids, key=lambda rid: haversine_km(point["lat"], point["lon"], *self.coords[rid]))
+            ids = self.nearest[key]
+        start, size = body.get("from", 0), body["size"]
+        return {"hits": {"hits": [{"_id": rid, "_source": {"restaurant_id": rid}} for rid in ids[start:start + size]]}}
+
+
+class FakeBulkOpenSearch:
+    """`_bulk` endpoint that takes `latency_s` + `per_doc_s` per request and rejects `reject_rate` of documents with 429."""
+
+    def __init__(self, latency_s: float = 0.02, per_doc_s: float = 5e-5, reject_rate: float = 0.0):
+        self.latency_s, self.per_doc_s, self.reject_rate = latency_s, per_doc_s, reject_rate
+
+    def bulk(self, body):
+        items = []
+        for line in body.splitlines():
+            op = "delete" if line.startswith('{"delete"') else "index" if line.startswith('{"index"') else None
+            if op:
+                status = 429 if random.random() < self.reject_rate else (201 if op == "index" else 200)
+                items.append({op: {"status": status}})
+        time.sleep(self.latency_s + self.per_doc_s * len(items))
+        return {"errors": any(next(iter(it.values()))["status"] >= 300 for it in items), "items": items}
+
+
+class FakeDynamoDB:
+    def __init__(self, items: list[dict]):
+        self.wire = {(it["cuisine"], it["business_id"]): {k: to_wire(v) for k, v in it.items()} for it in items}
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for table, req in RequestItems.items():
+            found = []
+            for key in req["Keys"]:
+                item = self.wire.get((key["cuisine"]["S"], key["business_id"]["S"]))
+                if item:
+                    found.append(item)
+            responses[table] = found
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+class FakeTable:
+    def __init__(self, boards: dict | None = None):
+        self.boards = boards or {}
+
+    def get_item(self, Key):
+        board = self.boards.get((Key["cuisine"], Key["business_id"]))
+        return {"Item": board or {**Key, "version": "benchmark", "leaderboards_version": "benchmark"}}
+
+
+class FakeSES:
+    def __init__(self):
+        self.sent = 0
+
+    def get_template(self, TemplateName):
+        return {"Template": {"TemplateName": TemplateName}}
+
+    def send_bulk_templated_email(self, Destinations, **kwargs):
+        self.sent += len(Destinations)
+        return {"Status": [{"Status": "Success", "MessageId": f"bench-{self.sent}-{i}"} for i in range(len(Destinations))]}
+
+
+def install_fakes(items: list[dict]) -> FakeSES:
+    ses = FakeSES()
+    search = FakeOpenSearch(items)
+    dynamo = FakeDynamoDB(items)
+    LF2.get_search_client = lambda: search
+    LF2.get_dynamodb = lambda: dynamo
+    LF2.get_table = lambda: FakeTable()
+    LF2.aws_clients.client = lambda service, region=None: ses
+    LF2.restaurant_cache.invalidate()
+    LF2.row_cache.invalidate()
+    return ses
+
+
+def sqs_batch(rng: random.Random, size: int, location: str = "Park Slope") -> dict:
+    records = []
+    for i in range(size):
+        body = {
+            "Location": location,
+            "Cuisine": rng.choice(CUISINES),
+            "DiningTime": rng.choice(["12:00", "13:30", "19:00", "20:30"]),
+            "NumPeople": "2",
+            "Email": f"user{rng.randint(0, 999)}@example.com",
+            "SessionId": f"session-{rng.randint(0, 9999)}",
+        }
+        records.append({"messageId": f"msg-{i}", "body": json.dumps(body)})
+    return {"Records": records}
+
+
+# ========== Measurement =====================================================
+
+def measure(fn, iterations: int, ops_per_call: int = 1, setup=None) -> dict:
+    """Latency percentiles and throughput over `iterations` calls, then peak memory of one more."""
+    latencies = []
+    gc.collect()
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "iterations": iterations,
+        "throughput_ops_per_s": round(iterations * ops_per_call / total, 1) if total else None,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+        "peak_mem_kb": round(peak / 1024, 1),
+    }
+
+
+_devnull = open(os.devnull, "w")
+
+
+def quiet(fn):
+    """LF2 logs per message; keep benchmark output readable."""
+    def run():
+        with contextlib.redirect_stdout(_devnull):
+            return fn()
+    return run
+
+
+def bench_size(size: int, iterations: int, batch_size: int) -> dict:
+    rng = random.Random(size)
+    businesses = build_catalog(size)
+    items = [dynamo_item(b) for b in businesses]
+    install_fakes(items)
+    results = {}
+
+    event = sqs_batch(rng, batch_size)
+    handler = quiet(lambda: LF2.lambda_handler(event, None))
+
+    def cold_caches():
+        LF2.restaurant_cache.invalidate("benchmark")
+        LF2.row_cache.invalidate()
+
+    results["lf2_handler_cold_cache"] = measure(handler, iterations, batch_size, setup=cold_caches)
+    results["lf2_handler_warm_cache"] = measure(handler, iterations, batch_size)
+
+    # redelivery of an already delivered batch: answered from the idempotency records alone
+    LF2.idempotency = MemoryIdempotencyStore(60, 3600)
+    handler()
+    results["lf2_handler_redelivered"] = measure(handler, iterations, batch_size)
+    LF2.idempotency = None
+
+    # leaderboard mode: city-wide requests (no distance term) read one precomputed item per (cuisine, hour)
+    boards = {(b["cuisine"], b["business_id"]): b for b in build_leaderboards([Restaurant.from_item(it) for it in items], "benchmark")}
+    LF2.get_table = lambda: FakeTable(boards)
+    city_event = sqs_batch(rng, batch_size, "New York")
+    city_handler = quiet(lambda: LF2.lambda_handler(city_event, None))
+    results["lf2_handler_remote_city_wide_cold"] = measure(city_handler, iterations, batch_size, setup=cold_caches)
+    LF2.LEADERBOARDS = True
+    results["lf2_handler_leaderboard_cold"] = measure(city_handler, iterations, batch_size, setup=cold_caches)
+    results["lf2_handler_leaderboard_cold"]["board_kb"] = round(max(len(b["restaurants"]) for b in boards.values()) / 1024, 1)
+    LF2.LEADERBOARDS = False
+    LF2.get_table = lambda: FakeTable()
+
+    # embedded mode: same batch answered from an in-process snapshot of the same catalog
+    data = build_snapshot(items, "benchmark")
+    results["snapshot_load"] = measure(lambda: CatalogSnapshot.from_bytes(data), max(3, iterations // 10), len(items))
+    results["snapshot_load"]["snapshot_kb"] = round(len(data) / 1024, 1)
+    LF2.CATALOG_SNAPSHOT, LF2._snapshot = "benchmark", CatalogSnapshot.from_bytes(data)
+    results["lf2_handler_embedded"] = measure(handler, iterations, batch_size)
+    LF2.CATALOG_SNAPSHOT, LF2._snapshot = "", None
+
+    day = 4
+    results["filter_by_dining_time"] = measure(
+        lambda: LF2.filter_by_dining_time(items, "19:00", day), max(3, iterations // 10), len(items))
+    index = LF2.OpeningHoursIndex(items)
+    results["filter_by_dining_time_prebuilt_index"] = measure(
+        lambda: LF2.filter_by_dining_time(items, "19:00", day, index=index), iterations, len(items))
+
+    # ranking every restaurant as a candidate: the old per-item sort vs. feature columns + top-k
+    limit = LF2.DEFAULT_LIMIT
+    results["rank_full_sort"] = measure(
+        lambda: sorted(items, key=lambda r: float(r.get("rating", 0)), reverse=True)[:limit], iterations, len(items))
+    columns = ranking.Columns(Restaurant.from_item(it) for it in items)
+    origin = GAZETTEER["park slope"]
+    results["rank_top_k_columns"] = measure(lambda: columns.top_k(limit), iterations, len(items))
+    results["rank_top_k_columns_geo"] = measure(lambda: columns.top_k(limit, origin), iterations, len(items))
+    for name in ("rank_top_k_columns", "rank_top_k_columns_geo"):
+        results[name]["backend"] = "numpy" if ranking.np is not None else "array"
+
+    top = sorted(items, key=lambda it: it["rating"], reverse=True)[:LF2.DEFAULT_LIMIT]
+    build_emails = lambda: (LF2.build_html_email("intro", top), LF2.build_text_email("intro", top))
+    results["email_builders_cold"] = measure(build_emails, iterations, setup=LF2.row_cache.invalidate)
+    results["email_builders_warm"] = measure(build_emails, iterations)
+
+    # re-indexing the catalog through _bulk: one connection vs. parallel connections, 1% of documents rejected once
+    docs = [(it["business_id"], search_document(it)) for it in items]
+
+    def reindex(workers):
+        indexer = BulkIndexer(FakeBulkOpenSearch(reject_rate=0.01), "benchmark", workers=workers, backoff=0.005)
+        for doc_id, doc in docs:
+            indexer.index(doc_id, doc)
+        stats = indexer.close()
+        assert stats.get("index") == len(docs), stats
+
+    results["opensearch_bulk_1_worker"] = measure(quiet(lambda: reindex(1)), max(3, iterations // 10), len(docs))
+    results["opensearch_bulk_4_workers"] = measure(quiet(lambda: reindex(4)), max(3, iterations // 10), len(docs))
+
+    # LF1 slot normalization over typical free-text answers (one dining intent's slots per op)
+    import LF1
+    answers = [
+        {"Location": "dinner in park slope", "Cuisine": "sushi", "DiningTime": "7:30 pm", "NumPeople": "two",
+         "Email": "jo at example dot com"},
+        {"Location": "nyc", "Cuisine": "itallian", "DiningTime": "noon", "NumPeople": "party of 4",
+         "Email": "Jo@Example.com"},
+    ]
+
+    def normalize():
+        for answer in answers:
+            LF1.normalize_slots({k: {"value": {"originalValue": v}} for k, v in answer.items()})
+
+    results["lf1_normalize_slots"] = measure(normalize, iterations, len(answers))
+
+    try:
+        import YelpFetch
+    except Exception as e:
+        results["yelp_validate_and_parse"] = {"skipped": f"{type(e).__name__}: {e}"}
+    else:
+        raw = json.dumps({"businesses": businesses})
+        parse = quiet(lambda: YelpFetch.validate_and_parse_fetched_data(raw))
+        results["yelp_validate_and_parse"] = measure(parse, max(3, iterations // 10), len(businesses))
+
+        # 1% of records broken: they are quarantined (kept in memory here) instead of failing the feed
+        broken = [dict(b, coordinates=None) if i % 100 == 0 else b for i, b in enumerate(businesses)]
+        raw_broken = json.dumps({"businesses": broken})
+        parse_broken = quiet(lambda: YelpFetch.validate_and_parse_fetched_data(raw_broken))
+        results["yelp_validate_and_parse_1pct_bad"] = measure(
+            parse_broken, max(3, iterations // 10), len(businesses), setup=YelpFetch.quarantine.records.clear)
+        YelpFetch.quarantine.records.clear()
+        YelpFetch.quarantine.reasons.clear()
+
+    try:
+        import requests  # noqa: F401
+    except ImportError as e:
+        results["yelp_ingest_stub"] = {"skipped": f"{type(e).__name__}: {e}"}
+    else:
+        results.update(bench_yelp_stub(iterations))
+
+    return results
+
+
+def ingest_from_stub(url: str, shards, checkpoint, should_stop=None, requests_per_second: float = 0) -> tuple[set, list]:
+    """Run yelp_ingest against the stub, advancing `checkpoint` like YelpFetch; returns (business ids, failed pages)."""
+    from yelp_ingest import iter_shard_pages, shard_key
+
+    ids, failed = set(), []
+    start_offsets = {shard_key(*shard): checkpoint.start_offset(shard_key(*shard)) for shard in shards}
+    pages = iter_shard_pages(shards, "restaurants", api_key="stub", url=url, requests_per_second=requests_per_second,
+                             start_offsets=start_offsets, should_stop=should_stop, failed=failed)
+    for location, category, offset, businesses, total in pages:
+        ids.update(biz["id"] for biz in businesses)
+        checkpoint.page_finished(shard_key(location, category), offset, len(businesses), total)
+    return ids, failed
+
+
+def bench_yelp_stub(iterations: int) -> dict:
+    """Paging, 429/5xx retries, rate limiting and checkpoint resume of yelp_ingest against the local stub server."""
+    import threading
+    from yelp_ingest import Checkpoint, MAX_RESULTS_PER_CATEGORY, shard_key
+    from yelp_stub_server import make_server, search_url
+
+    shards = [(location, category) for location in ("Brooklyn", "Queens") for category in CUISINES]
+    expected = len(shards) * MAX_RESULTS_PER_CATEGORY
+    results = {}
+
+    def serve(**faults):
+        server = make_server(total=MAX_RESULTS_PER_CATEGORY + 100, **faults)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def server_stats(server) -> dict:
+        return dict(server.RequestHandlerClass.state.stats)
+
+    # clean paging at full speed, then 5% 503s, 5% 429s and a server-side rps cap the client stays under
+    for name, faults, rps in (
+        ("yelp_ingest_stub", {}, 0),
+        ("yelp_ingest_stub_faults", {"fail_rate": 0.05, "throttle_rate": 0.05, "max_rps": 200}, 150),
+    ):
+        server = serve(**faults)
+        outcome = {}
+
+        def run():
+            ids, failed = ingest_from_stub(search_url(server), shards, Checkpoint(), requests_per_second=rps)
+            outcome.update(complete=len(ids) == expected and not failed)
+
+        results[name] = measure(quiet(run), max(3, iterations // 10), expected)
+        stats = server_stats(server)
+        results[name].update(complete=outcome["complete"], requests=stats.get("requests", 0),
+                             retried=stats.get("failed", 0) + stats.get("throttled", 0),
+                             rate_limited=stats.get("rate_limited", 0))
+        server.shutdown()
+        server.server_close()
+
+    # stop once a third of the results are checkpointed, then resume as a re-invoked YelpFetch would
+    server = serve()
+    checkpoint = Checkpoint()
+
+    def progress():
+        return sum(checkpoint.start_offset(shard_key(*shard)) for shard in shards)
+
+    first, _ = quiet(lambda: ingest_from_stub(search_url(server), shards, checkpoint,
+                                              should_stop=lambda: progress() >= expected // 3))()
+    resumed_from = progress()
+    second, failed = quiet(lambda: ingest_from_stub(search_url(server), shards, checkpoint))()
+    results["yelp_ingest_stub_resume"] = {
+        "complete": len(first | second) == expected and not failed
+                    and all(checkpoint.is_done(shard_key(*shard)) for shard in shards),
+        "first_run_businesses": len(first),
+        "resumed_from_offsets": resumed_from,
+        "refetched": len(first & second),
+        "requests": server_stats(server).get("requests", 0),
+    }
+    server.shutdown()
+    server.server_close()
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline: dict):
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for size, scenarios in current["results"].items():
+        for name, cur in scenarios.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if not old or "p50_ms" not in cur or "p50_ms" not in old:
+                continue
+            delta = (cur["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            print(f"  {size:>8} {name:<40} p50 {old['p50_ms']:>10.3f} -> {cur['p50_ms']:>10.3f} ms ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes (1k-1M)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=10, help="SQS messages per LF2 invocation")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "results": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        print(f"[INFO] Benchmarking catalog of {size} restaurants")
+        report["results"][str(size)] = bench_size(size, args.iterations, args.batch_size)
+        for name, r in report["results"][str(size)].items():
+            print(f"  {name:<40} {json.dumps(r)}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
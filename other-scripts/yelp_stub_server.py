@@ -0,0 +1,189 @@
+"""
+Local stand-in for the Yelp Fusion business search endpoint.
+
+Serves GET /v3/businesses/search with deterministic synthetic businesses for any
+(location, categories) pair, paged by `offset`/`limit` up to `--total` results, so
+YelpFetch and yelp_ingest can run offline:
+
+    python other-scripts/yelp_stub_server.py --port 8765 --fail-rate 0.05 --throttle-rate 0.05
+    YELP_SEARCH_URL=http://127.0.0.1:8765/v3/businesses/search YELP_API_KEY=stub ...
+
+Faults are injected per request: `--fail-rate` answers 503, `--throttle-rate` answers
+429, and more than `--max-rps` requests per second are answered 429 as Yelp does.
+Both carry `Retry-After: --retry-after`. GET /stats returns the request counts.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = "/v3/businesses/search"
+MAX_LIMIT = 50
+
+
+def make_business(location: str, category: str, i: int) -> dict:
+    """The `i`th result of a search, in Yelp search-response shape; the same for every call."""
+    rng = random.Random(zlib.crc32(f"{location}|{category}|{i}".encode("utf-8")))
+    start = rng.choice([700, 900, 1100, 1200, 1700])
+    end = rng.choice([1500, 2100, 2200, 2300, 200])
+    days = sorted(rng.sample(range(7), rng.randint(5, 7)))
+    slug = "".join(ch for ch in location.lower() if ch.isalnum())
+    return {
+        "id": f"stub-{slug}-{category}-{i:05d}",
+        "name": f"{location} {category.title()} {i}",
+        "categories": [{"alias": category, "title": category.title()}],
+        "rating": rng.choice([3.0, 3.5, 4.0, 4.5, 5.0]),
+        "review_count": rng.randint(0, 3000),
+        "coordinates": {"latitude": 40.6 + rng.random() / 10, "longitude": -74.0 + rng.random() / 10},
+        "price": rng.choice(["$", "$$", "$$$", None]),
+        "location": {
+            "address1": f"{rng.randint(1, 999)} Main St",
+            "address2": "",
+            "address3": "",
+            "city": location,
+            "zip_code": f"112{rng.randint(0, 99):02d}",
+            "country": "US",
+            "state": "NY",
+            "display_address": [f"{rng.randint(1, 999)} Main St", f"{location}, NY"],
+        },
+        "business_hours": [{
+            "open": [{"day": d, "start": f"{start:04d}", "end": f"{end:04d}", "is_overnight": end < start} for d in days],
+            "hours_type": "REGULAR",
+            "is_open_now": True,
+        }],
+    }
+
+
+class StubState:
+    def __init__(self, total: int, fail_rate: float, throttle_rate: float, max_rps: float, retry_after: float,
+                 seed: int):
+        self.total = total
+        self.fail_rate = fail_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.stats = Counter()
+        self.window = []  # request times within the last second
+        self.lock = threading.Lock()
+
+    def fault(self) -> int | None:
+        """Status to answer instead of results, if any."""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 1.0]
+            self.window.append(now)
+            if self.max_rps and len(self.window) > self.max_rps:
+                self.stats["rate_limited"] += 1
+                return 429
+            roll = self.rng.random()
+            if roll < self.fail_rate:
+                self.stats["failed"] += 1
+                return 503
+            if roll < self.fail_rate + self.throttle_rate:
+                self.stats["throttled"] += 1
+                return 429
+            self.stats["pages"] += 1
+            return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None  # set by make_server
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            with self.state.lock:
+                return self._send(200, dict(self.state.stats))
+        if url.path != SEARCH_PATH:
+            return self._send(404, {"error": {"code": "NOT_FOUND", "description": url.path}})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send(401, {"error": {"code": "UNAUTHORIZED_ACCESS_TOKEN", "description": "missing key"}})
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            location = params["location"]
+            category = params.get("categories", "restaurants")
+            limit = int(params.get("limit", 20))
+            offset = int(params.get("offset", 0))
+        except (KeyError, ValueError) as e:
+            return self._send(400, {"error": {"code": "VALIDATION_ERROR", "description": str(e)}})
+        if not 0 < limit <= MAX_LIMIT or offset < 0:
+            return self._send(400, {"error": {"code": "VALIDATION_ERROR", "description": "bad limit/offset"}})
+
+        status = self.state.fault()
+        if status == 429:
+            return self._send(429, {"error": {"code": "TOO_MANY_REQUESTS_PER_SECOND",
+                                              "description": "You have exceeded the queries-per-second limit"}},
+                              retry_after=True)
+        if status == 503:
+            return self._send(503, {"error": {"code": "SERVICE_UNAVAILABLE", "description": "stub fault"}},
+                              retry_after=True)
+
+        end = min(offset + limit, self.state.total)
+        businesses = [make_business(location, category, i) for i in range(offset, end)]
+        self._send(200, {"businesses": businesses, "total": self.state.total, "region": {}})
+
+    def _send(self, status: int, body: dict, retry_after: bool = False):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if retry_after:
+            self.send_header("Retry-After", str(self.state.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, *, total: int = 200, fail_rate: float = 0.0,
+                throttle_rate: float = 0.0, max_rps: float = 0.0, retry_after: float = 0.05,
+                seed: int = 7) -> ThreadingHTTPServer:
+    """A stub server (port 0 picks a free one); its search URL is `search_url(server)`."""
+    handler = type("BoundStubHandler", (StubHandler,), {
+        "state": StubState(total, fail_rate, throttle_rate, max_rps, retry_after, seed),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def search_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{SEARCH_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--total", type=int, default=200, help="results per (location, category)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="answer 429 above this rate (0 = no limit)")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After seconds on 429/503")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, total=args.total, fail_rate=args.fail_rate,
+                         throttle_rate=args.throttle_rate, max_rps=args.max_rps, retry_after=args.retry_after,
+                         seed=args.seed)
+    print(f"[INFO] Yelp stub serving {search_url(server)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()